@@ -0,0 +1,334 @@
+import os
+import sys
+import time
+import json
+import random
+import shutil
+import tempfile
+import platform
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import argparse
+
+import nltk
+import PyPDF2
+from PyPDF2 import PdfWriter, PageObject
+from PyPDF2.generic import (ArrayObject, DecodedStreamObject, DictionaryObject, NameObject,
+                            NumberObject)
+
+import pdf_splitter
+from pdf_splitter import (DEFAULT_KEYWORD_ENGINE, FALLBACK_STOP_WORDS, KEYWORD_ENGINES, METRICS,
+                          PLAN_FILL_RATIO, PdfDocument, estimate_page_costs,
+                          extract_keywords_from_text, generate_folder_name, generate_split_name,
+                          peak_rss_bytes, plan_splits, split_pdf_by_size)
+
+# Default location for benchmark results
+DEFAULT_RESULTS_FILE = "benchmark_results.json"
+
+# Default split size used by the benchmark; small enough that every case splits
+DEFAULT_BENCH_MAX_SIZE_MB = 2
+
+# Vocabulary for generated text; drawn with a skewed distribution so keyword
+# extraction sees realistic word frequencies
+VOCABULARY = ("turbine pressure valve maintenance hydraulic inspection procedure torque "
+              "bearing coupling compressor actuator manifold gasket flange calibration "
+              "sensor voltage circuit relay breaker transformer conductor insulation "
+              "lubricant seal housing impeller shaft alignment vibration tolerance "
+              "specification warranty assembly diagram schematic revision appendix").split()
+FILLER_WORDS = ("the of and to in is for with on that by this be are as at from it or "
+                "an was which all each should must when before after during").split()
+
+# Corpus cases: name -> generator options
+CORPUS_CASES = {
+    "text_only": {"pages": 400, "lines_per_page": 45},
+    "image_heavy": {"pages": 60, "lines_per_page": 10, "image_kb": 200},
+    "shared_fonts": {"pages": 300, "lines_per_page": 40, "font_kb": 400, "fonts": 3},
+    "oversized_page": {"pages": 20, "lines_per_page": 20, "image_kb": 40, "oversized_kb": 3072},
+}
+
+
+def _random_line(rnd, words_per_line=12):
+    """Return one line of pseudo-technical text."""
+    words = []
+    for _ in range(words_per_line):
+        if rnd.random() < 0.45:
+            words.append(rnd.choice(FILLER_WORDS))
+        else:
+            # Skew towards the start of the vocabulary so some terms dominate
+            index = min(int(rnd.expovariate(1 / 8)), len(VOCABULARY) - 1)
+            words.append(VOCABULARY[index])
+    return " ".join(words)
+
+
+def _image_xobject(writer, size_kb, rnd):
+    """Add an incompressible grayscale image of roughly size_kb and return its reference."""
+    side = max(1, int((size_kb * 1024) ** 0.5))
+    image = DecodedStreamObject()
+    image.set_data(rnd.randbytes(side * side))
+    image.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(side),
+        NameObject("/Height"): NumberObject(side),
+        NameObject("/ColorSpace"): NameObject("/DeviceGray"),
+        NameObject("/BitsPerComponent"): NumberObject(8),
+    })
+    return writer._add_object(image)
+
+
+def _font_dictionary(writer, base_font, font_kb, rnd):
+    """Add a font, optionally with an embedded font program, and return its reference."""
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject(base_font),
+    })
+    if font_kb:
+        program = DecodedStreamObject()
+        program.set_data(rnd.randbytes(font_kb * 1024))
+        descriptor = DictionaryObject({
+            NameObject("/Type"): NameObject("/FontDescriptor"),
+            NameObject("/FontName"): NameObject(base_font),
+            NameObject("/Flags"): NumberObject(32),
+            NameObject("/FontBBox"): ArrayObject([NumberObject(0), NumberObject(0),
+                                                  NumberObject(1000), NumberObject(1000)]),
+            NameObject("/FontFile"): writer._add_object(program),
+        })
+        font[NameObject("/FontDescriptor")] = writer._add_object(descriptor)
+    return writer._add_object(font)
+
+
+def generate_pdf(path, pages, lines_per_page=40, image_kb=0, font_kb=0, fonts=1,
+                 oversized_kb=0, seed=1):
+    """Write a synthetic PDF to path and return its size in bytes."""
+    rnd = random.Random(seed)
+    writer = PdfWriter()
+    base_fonts = ["/Helvetica", "/Times-Roman", "/Courier", "/Helvetica-Bold"]
+    font_refs = [_font_dictionary(writer, base_fonts[i % len(base_fonts)], font_kb, rnd)
+                 for i in range(fonts)]
+
+    for page_num in range(pages):
+        page = PageObject.create_blank_page(None, 612, 792)
+        font_index = page_num % len(font_refs)
+        resources = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font_refs[font_index]})
+        })
+        lines = [f"BT /F1 10 Tf 50 {760 - i * 16} Td ({_random_line(rnd)}) Tj ET"
+                 for i in range(lines_per_page)]
+
+        # The oversized case puts one huge image in the middle of the document
+        image_size = oversized_kb if oversized_kb and page_num == pages // 2 else image_kb
+        if image_size:
+            resources[NameObject("/XObject")] = DictionaryObject({
+                NameObject("/Im1"): _image_xobject(writer, image_size, rnd)
+            })
+            lines.append("q 200 0 0 200 50 50 cm /Im1 Do Q")
+
+        contents = DecodedStreamObject()
+        contents.set_data("\n".join(lines).encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(contents)
+        page[NameObject("/Resources")] = resources
+        writer.add_page(page)
+
+    with open(path, "wb") as f:
+        writer.write(f)
+    return os.path.getsize(path)
+
+
+def generate_corpus(corpus_dir, scale=1.0, cases=None):
+    """Generate the benchmark corpus and return a mapping of case name to PDF path."""
+    os.makedirs(corpus_dir, exist_ok=True)
+    corpus = {}
+    for name, options in CORPUS_CASES.items():
+        if cases and name not in cases:
+            continue
+        options = dict(options)
+        options["pages"] = max(1, int(options["pages"] * scale))
+        path = os.path.join(corpus_dir, f"{name}.pdf")
+        if not os.path.exists(path):
+            started = time.perf_counter()
+            size = generate_pdf(path, **options)
+            print(f"Generated {name}: {options['pages']} pages, {size / (1024 * 1024):.1f}MB "
+                  f"in {time.perf_counter() - started:.1f}s")
+        corpus[name] = path
+    return corpus
+
+
+def run_case(name, pdf_path, max_size_mb, split_workers=1, max_rss_mb=None,
+             keyword_engine=DEFAULT_KEYWORD_ENGINE, optimize=False):
+    """Benchmark one corpus PDF; runs in a fresh process so peak RSS is per case."""
+    stop_words = FALLBACK_STOP_WORDS
+    # Without the Punkt data, time NLTK's word tokenizer on its own rather than failing
+    try:
+        nltk.data.find("tokenizers/punkt")
+    except LookupError:
+        pdf_splitter.word_tokenize = nltk.tokenize.NLTKWordTokenizer().tokenize
+    input_bytes = os.path.getsize(pdf_path)
+    stages = {}
+
+    def timed(stage, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - started
+        return result
+
+    # Individual stages, measured against one shared document
+    document = timed("parse", PdfDocument, pdf_path)
+    page_count = document.page_count
+    timed("folder_naming", generate_folder_name, pdf_path, stop_words, document=document,
+          keyword_engine=keyword_engine)
+    page_costs = timed("cost_model", estimate_page_costs, document.reader, optimize=optimize)
+    plan = timed("planning", plan_splits, page_costs,
+                 int(max_size_mb * 1024 * 1024 * PLAN_FILL_RATIO))
+    for i, (start_page, end_page) in enumerate(plan):
+        timed("split_naming", generate_split_name, pdf_path, start_page, end_page, i + 1,
+              stop_words, document=document, keyword_engine=keyword_engine)
+    text = timed("text_extraction", document.text_range, 0, page_count,
+                 max_chars=float("inf"))
+    timed("keywords", extract_keywords_from_text, text, stop_words, engine=keyword_engine)
+    document.close()
+
+    # End to end split on a private copy, counting trial writes and in-memory probes
+    work_dir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        complete_folder = os.path.join(work_dir, "complete")
+        original_folder = os.path.join(work_dir, "original")
+        os.makedirs(complete_folder)
+        os.makedirs(original_folder)
+        work_path = os.path.join(work_dir, os.path.basename(pdf_path))
+        shutil.copyfile(pdf_path, work_path)
+
+        METRICS.reset()
+        ok = timed("split_total", split_pdf_by_size, work_path, complete_folder, original_folder,
+                   stop_words, max_size_mb=max_size_mb, split_workers=split_workers,
+                   use_index=False, max_rss_mb=max_rss_mb, keyword_engine=keyword_engine,
+                   optimize=optimize)
+
+        output_files = []
+        for root, _, files in os.walk(complete_folder):
+            output_files.extend(os.path.join(root, f) for f in files if f.endswith(".pdf"))
+        output_sizes = [os.path.getsize(f) for f in output_files]
+        split_metrics = METRICS.snapshot()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    split_seconds = stages["split_total"]
+    return {
+        "case": name,
+        "ok": bool(ok),
+        "pages": page_count,
+        "input_mb": round(input_bytes / (1024 * 1024), 3),
+        "planned_splits": len(plan),
+        "output_files": len(output_files),
+        "largest_output_mb": round(max(output_sizes, default=0) / (1024 * 1024), 3),
+        "pages_per_sec": round(page_count / split_seconds, 2) if split_seconds else None,
+        "mb_per_sec": round(input_bytes / (1024 * 1024) / split_seconds, 2) if split_seconds else None,
+        "trial_writes": split_metrics["timers"].get("write", {}).get("count", 0),
+        "probes": split_metrics["timers"].get("probe", {}).get("count", 0),
+        "peak_rss_mb": round(peak_rss_bytes() / (1024 * 1024), 1),
+        "stage_seconds": {stage: round(seconds, 4) for stage, seconds in stages.items()},
+        "split_metrics": split_metrics,
+    }
+
+
+def run_benchmarks(corpus, max_size_mb, split_workers=1, max_rss_mb=None, repeat=1,
+                   keyword_engine=DEFAULT_KEYWORD_ENGINE, optimize=False):
+    """Run every corpus case in its own process and return the results."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for name, pdf_path in corpus.items():
+        for run in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_case, name, pdf_path, max_size_mb,
+                                         split_workers, max_rss_mb, keyword_engine, optimize).result()
+            result["run"] = run + 1
+            results.append(result)
+            print(f"{name:<15} run {run + 1}: {result['pages_per_sec']} pages/s, "
+                  f"{result['mb_per_sec']} MB/s, {result['trial_writes']} writes, "
+                  f"{result['probes']} probes, peak RSS {result['peak_rss_mb']}MB")
+    return results
+
+
+def compare_results(results, baseline_path):
+    """Print the change in throughput and peak RSS against an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = {(r["case"], r.get("run", 1)): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        previous = baseline.get((result["case"], result["run"]))
+        if not previous:
+            continue
+        changes = []
+        for key in ("pages_per_sec", "mb_per_sec", "peak_rss_mb"):
+            if previous.get(key) and result.get(key) is not None:
+                changes.append(f"{key} {(result[key] - previous[key]) / previous[key]:+.1%}")
+        print(f"  {result['case']:<15} " + ", ".join(changes))
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark PDF Splitter on a synthetic corpus")
+    parser.add_argument("--corpus-dir",
+                        help="Where to generate (and reuse) the corpus; a temporary folder by default")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply the page counts of every corpus case")
+    parser.add_argument("--case", action="append", choices=sorted(CORPUS_CASES),
+                        help="Only run the given case (repeatable)")
+    parser.add_argument("--max-size", type=int, default=DEFAULT_BENCH_MAX_SIZE_MB,
+                        help="Maximum size of each split in MB")
+    parser.add_argument("--split-workers", type=int, default=1,
+                        help="Processes used to write the splits of one PDF")
+    parser.add_argument("--max-rss", type=int, default=None, metavar="MB",
+                        help="Benchmark the low-memory mode with this memory budget")
+    parser.add_argument("--keyword-engine", choices=KEYWORD_ENGINES, default=DEFAULT_KEYWORD_ENGINE,
+                        help="Keyword extraction engine used for naming")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Benchmark splits written with --optimize")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Number of runs per case")
+    parser.add_argument("--output", default=DEFAULT_RESULTS_FILE,
+                        help="JSON file the results are written to")
+    parser.add_argument("--compare", metavar="RESULTS_JSON",
+                        help="Earlier results file to compare against")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="pdf_splitter_corpus_")
+    try:
+        corpus = generate_corpus(corpus_dir, args.scale, args.case)
+        results = run_benchmarks(corpus, args.max_size, args.split_workers, args.max_rss,
+                                 args.repeat, args.keyword_engine, args.optimize)
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pypdf2": PyPDF2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "scale": args.scale,
+            "max_size_mb": args.max_size,
+            "split_workers": args.split_workers,
+            "max_rss_mb": args.max_rss,
+            "keyword_engine": args.keyword_engine,
+            "optimize": args.optimize,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare_results(results, args.compare)
+
+    return 0 if all(r["ok"] for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
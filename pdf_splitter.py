@@ -1,19 +1,49 @@
 import os
+import re
 import time
+
+# Startup time is measured from here, so it includes importing the dependencies below
+STARTUP_STARTED = time.perf_counter()
+
 import shutil
 import sys
-import tempfile  # Added for temporary file handling
+import queue
+import threading
+import multiprocessing
+import signal
+import socket
+import hashlib
+import json
+import sqlite3
+import mmap
+import gc
+import heapq
+import asyncio
+import uuid
+import io
+import zlib
+import errno
+import http.client
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
 from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import (ArrayObject, DictionaryObject, EncodedStreamObject, IndirectObject,
+                            NameObject, NullObject, StreamObject)
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from collections import Counter
+from collections import Counter, OrderedDict
 from datetime import datetime
 import argparse
 import logging  # Added for better logging
 
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -42,13 +72,271 @@ DEFAULT_DROP_FOLDER = get_absolute_path("PDF Split Drop")
 DEFAULT_COMPLETE_FOLDER = get_absolute_path("PDF Split Drop/Split Drop Complete")
 DEFAULT_ORIGINAL_FOLDER = get_absolute_path("PDF Split Drop/Original PDF")
 
+# Maximum number of pages whose extracted text is kept in memory per document
+DEFAULT_TEXT_CACHE_PAGES = 256
+
+# Pages and characters of a document's start that its folder name's keywords are ranked from
+FOLDER_NAME_PAGES = 5
+FOLDER_NAME_TEXT_CHARS = 3000
+
+# Processes extracting naming text in parallel (--text-workers); documents with fewer pages
+# are extracted in-process, where starting the pool would cost more than it saves
+DEFAULT_TEXT_WORKERS = 1
+TEXT_POOL_MIN_PAGES = 64
+
+# Serialization overhead used by the split planner: each indirect object costs its
+# "N 0 obj"/"endobj" wrapper plus a 20-byte xref entry, and every output file carries
+# a header, catalog, page tree, info dictionary and trailer.
+PDF_OBJECT_OVERHEAD = 48
+PDF_FILE_OVERHEAD = 1024
+
+# Fraction of --max-size the planner packs pages into, leaving room for estimation error
+PLAN_FILL_RATIO = 0.97
+
+# Split optimization (--optimize): names used in content streams decide which page resources
+# are kept, and uncompressed streams shorter than this are not worth Flate-compressing.
+# Larger streams are compressed only if a sample of their start shrinks by the given ratio.
+RESOURCE_NAME_PATTERN = re.compile(rb"/[^\s/\[\]()<>{}%]+")
+MIN_COMPRESS_BYTES = 64
+COMPRESS_SAMPLE_BYTES = 64 * 1024
+COMPRESS_SAMPLE_RATIO = 0.9
+
+# Default number of worker processes splitting PDFs in parallel
+DEFAULT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+# Number of PDFs that may wait in the work queue before new drops block (backpressure)
+DEFAULT_QUEUE_SIZE = 100
+
+# Job scheduling: queued PDFs run cheapest first, a job costing its file size plus a fixed amount
+# per page. Each second spent waiting takes SCHEDULER_AGING_BYTES_PER_SECOND off a job's cost so
+# large files are not starved, and each priority level is worth SCHEDULER_PRIORITY_BYTES.
+SCHEDULER_PAGE_COST_BYTES = 32 * 1024
+SCHEDULER_AGING_BYTES_PER_SECOND = 10 * 1024 * 1024
+SCHEDULER_PRIORITY_BYTES = 1024 * 1024 * 1024
+
+# Memory a job is assumed to need under --memory-budget (without --max-rss): a fixed base
+# plus a multiple of the file size, since PyPDF2 holds the parsed document in memory
+JOB_BASE_MEMORY_BYTES = 128 * 1024 * 1024
+JOB_MEMORY_FACTOR = 2
+
+# Seconds a dropped file must go without events or size/mtime changes before it is processed
+DEFAULT_SETTLE_SECONDS = 2.0
+
+# SQLite index of processed documents, kept in the complete folder
+INDEX_FILENAME = ".pdf_splitter_index.sqlite3"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# What to do when a PDF with already-processed content is dropped again
+DUPLICATE_ACTIONS = ("skip", "link", "copy")
+
+# The timestamp generate_folder_name appends to an output folder name, and any collision suffix after it
+FOLDER_NAME_SUFFIX_PATTERN = re.compile(r"_\d{8}_\d{6}(?:_\d+)?$")
+
+# Suffix of the per-job checkpoint journals written next to each output folder
+JOURNAL_SUFFIX = ".journal.json"
+
+# Hidden folder in the complete folder where a document's outputs are staged until its whole
+# folder is published, and the bytes of staged splits written before they are fsynced together
+STAGING_FOLDER = ".staging"
+FSYNC_BATCH_BYTES = 64 * 1024 * 1024
+
+# Suffixes in the staging folder of a published folder's staged replacement, and of the old
+# folder while the replacement is swapped in
+REPLACEMENT_SUFFIX = ".replacement"
+REPLACED_SUFFIX = ".replaced"
+
+# File in a reserved output folder naming the job that owns it (the content hash of its PDF)
+OWNER_FILENAME = ".owner"
+
+# Per-document manifest kept in each output folder for the resplit command, with the number
+# of candidate keywords it keeps per page (enough to rank split names without the text)
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+MANIFEST_PAGE_KEYWORDS = 10
+
+# Characters of a split's text (from its first pages) that its name's keywords are ranked from
+SPLIT_NAME_TEXT_CHARS = 2000
+
+# Low-memory mode: text cache size, and the memory one split-writing process is assumed
+# to need (as a multiple of --max-size) until a worker has reported its actual peak
+LOW_MEMORY_TEXT_CACHE_PAGES = 16
+SPLIT_WORKING_SET_FACTOR = 3
+
+# Serialized splits that may wait for the finisher thread to write them (1 in low-memory mode)
+DEFAULT_PIPELINE_DEPTH = 2
+
+# Keyword engines: "fast" counts words with one precompiled tokenizer, "nltk" runs word_tokenize
+KEYWORD_ENGINES = ("fast", "nltk")
+DEFAULT_KEYWORD_ENGINE = "fast"
+
+# Keyword candidates as word_tokenize would emit them: words of four or more letters/digits
+# between token breaks, with clitics such as 's or n't split off. Break characters are always
+# split off; early breaks are the ones padded before word_tokenize looks for a closing quote.
+# Words its contraction rules cut in two ("gonna" -> "gon", "na") are never candidates.
+# A period followed by whitespace is taken as a sentence end, which punkt decides in NLTK.
+KEYWORD_TOKEN_BREAKS = "\\s;@#$%&?!*()\\[\\]{}<>\"`\u00ab\u00bb\u201c\u201d\u2018\u2019\u201e\u2012-\u2015"
+KEYWORD_EARLY_BREAKS = "\\x20;@#$%&?!`\u00ab\u201c\u2018\u201e\u2012-\u2015"
+KEYWORD_CONTRACTIONS = "cannot|gimme|gonna|gotta|lemme|wanna"
+KEYWORD_TOKEN_PATTERN = re.compile(rf"""
+    (?<!\w)(?=[^\W_])                                            # the start of a run of letters/digits
+    (?: (?<![^{KEYWORD_TOKEN_BREAKS}])                            # after a break character,
+      | (?: (?<=(?<![,:])[,:]) | (?<=(?<![,:])[,:]{{3}}) )(?!\d)  # a comma or colon not before a digit,
+      | (?<=\.\.) | (?<='') | (?<=(?<!\w)')                       # an ellipsis or an opening quote,
+      | (?<=(?<!-)--) | (?<=(?<!-)-{{4}}) | (?<=(?<!-)-{{6}}) | (?<=(?<!-)-{{8}})  # an even run of dashes,
+      | (?<!\w)(?=more'n(?!\w)) )                                # or at the start of "more'n"
+    (?!(?:{KEYWORD_CONTRACTIONS})(?:n't)?(?!\w))
+    ([^\W_]{{4,}})                                                # the word
+    (?:'ll|'re|'ve|n't)?                                          # clitics
+    (?: (?:'s|'m|'d)?'(?= [{KEYWORD_EARLY_BREAKS}] | [,:](?!\d) | \.\.          # closing quote before an early break
+                        | \.[\])}}>"'\u00bb\u201d\u2019\x20]*(?:\s|$) )
+      | (?:'s|'m|'d|')?(?= [{KEYWORD_TOKEN_BREAKS}] | $ | [,:](?!\d) | \.\. | -- | ''  # a token break after
+                         | \.[\])}}>"'\u00bb\u201d\u2019]*(?:\s|$) )                  # or a sentence-final period
+      | (?<=\bmore)'n(?!\w) )
+""", re.VERBOSE)
+
+# Output modes: PDF splits, or text-only JSONL chunks bounded by a character and/or token budget
+OUTPUT_MODES = ("pdf", "jsonl")
+DEFAULT_CHUNK_CHARS = 20000
+
+# Approximate tokens for --chunk-tokens: runs of word characters and single punctuation marks
+CHUNK_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Metrics export: a Prometheus text file and per-job JSON summaries under --metrics-dir
+METRICS_FILENAME = "pdf_splitter.prom"
+METRICS_PREFIX = "pdf_splitter"
+JOB_SUMMARY_FOLDER = "jobs"
+
+# Multi-node claims (--node-id): PDFs are claimed by renaming them into processing/<node-id>/ in
+# the drop folder, and each node renews processing/<node-id>.lease while it is alive
+PROCESSING_FOLDER = "processing"
+LEASE_SUFFIX = ".lease"
+DEFAULT_LEASE_TIMEOUT = 60.0
+
+# Uploading finished outputs (--upload-url): concurrent uploads, retries with exponential
+# backoff, and the chunk size above which a file is sent in Content-Range chunks
+DEFAULT_UPLOAD_CONCURRENCY = 4
+DEFAULT_UPLOAD_RETRIES = 5
+UPLOAD_BACKOFF_SECONDS = 1.0
+UPLOAD_MAX_BACKOFF_SECONDS = 30.0
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+UPLOAD_TIMEOUT_SECONDS = 60
+
+# HTTP ingestion (serve): uploads are spooled to .uploads/<job-id>/ in the drop folder. Request
+# bodies over the size limit are refused, at most DEFAULT_MAX_UPLOADS are read at once, and the
+# most recent SERVE_JOB_HISTORY jobs can be polled
+UPLOADS_FOLDER = ".uploads"
+DEFAULT_SERVE_HOST = "127.0.0.1"
+DEFAULT_SERVE_PORT = 8750
+DEFAULT_MAX_UPLOAD_MB = 1024
+DEFAULT_MAX_UPLOADS = 4
+SERVE_READ_BYTES = 1024 * 1024
+SERVE_HEADER_BYTES = 64 * 1024
+SERVE_JOB_HISTORY = 10000
+
+# Common English stopwords used when the NLTK corpus cannot be loaded
+FALLBACK_STOP_WORDS = frozenset(['i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you',
+                                 "you're", "you've", "you'll", "you'd", 'your', 'yours', 'yourself',
+                                 'yourselves', 'he', 'him', 'his', 'himself', 'she', "she's", 'her',
+                                 'hers', 'herself', 'it', "it's", 'its', 'itself', 'they', 'them',
+                                 'their', 'theirs', 'themselves', 'what', 'which', 'who', 'whom',
+                                 'this', 'that', "that'll", 'these', 'those', 'am', 'is', 'are',
+                                 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having',
+                                 'do', 'does', 'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if',
+                                 'or', 'because', 'as', 'until', 'while', 'of', 'at', 'by', 'for',
+                                 'with', 'about', 'against', 'between', 'into', 'through', 'during',
+                                 'before', 'after', 'above', 'below', 'to', 'from', 'up', 'down',
+                                 'in', 'out', 'on', 'off', 'over', 'under', 'again', 'further',
+                                 'then', 'once', 'here', 'there', 'when', 'where', 'why', 'how',
+                                 'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other',
+                                 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so',
+                                 'than', 'too', 'very'])
+
+class Metrics:
+    """Thread-safe counters and stage timers for one process.
+
+    Timers keep a count, total and maximum duration per stage. Worker processes
+    send a ``snapshot`` back with their results and the daemon ``merge``s it into
+    its own registry, which is exported in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._timers = {}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name, seconds):
+        """Record one duration for the named timer."""
+        with self._lock:
+            timer = self._timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Time the enclosed block, recording it even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self):
+        """Return the current values as a JSON-serializable dict."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timers": {name: {"count": count, "seconds": round(total, 6), "max_seconds": round(longest, 6)}
+                           for name, (count, total, longest) in self._timers.items()},
+            }
+
+    def merge(self, snapshot):
+        """Add the values of another process's snapshot to this registry."""
+        with self._lock:
+            self._counters.update(snapshot.get("counters", {}))
+            for name, values in snapshot.get("timers", {}).items():
+                timer = self._timers.setdefault(name, [0, 0.0, 0.0])
+                timer[0] += values["count"]
+                timer[1] += values["seconds"]
+                timer[2] = max(timer[2], values["max_seconds"])
+
+    def to_prometheus(self, prefix=METRICS_PREFIX):
+        """Render the registry in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, values in sorted(snapshot["timers"].items()):
+            lines.append(f"# TYPE {prefix}_{name}_seconds summary")
+            lines.append(f"{prefix}_{name}_seconds_count {values['count']}")
+            lines.append(f"{prefix}_{name}_seconds_sum {values['seconds']}")
+            lines.append(f"# TYPE {prefix}_{name}_seconds_max gauge")
+            lines.append(f"{prefix}_{name}_seconds_max {values['max_seconds']}")
+        return "\n".join(lines) + "\n"
+
+# Metrics of this process; worker processes report theirs back with each result
+METRICS = Metrics()
+
 def setup_nltk():
     """Download NLTK data if not already available and return stopwords."""
+    # Imported here rather than at module level so startup does not pay for NLTK
+    import nltk
+    from nltk.corpus import stopwords
     try:
         # Try to use existing stopwords first
         nltk.data.find('corpora/stopwords')
         nltk.data.find('tokenizers/punkt')
-        stop_words = set(stopwords.words('english'))
+        stop_words = frozenset(stopwords.words('english'))
         logger.info("NLTK data already downloaded and available")
         return stop_words
     except LookupError:
@@ -64,7 +352,7 @@ def setup_nltk():
             
             # Double-check that data is now available
             try:
-                stop_words = set(stopwords.words('english'))
+                stop_words = frozenset(stopwords.words('english'))
                 logger.info("NLTK data successfully downloaded and loaded")
                 return stop_words
             except LookupError as e:
@@ -74,33 +362,51 @@ def setup_nltk():
             logger.warning(f"Could not download NLTK data: {e}")
             # Fallback with common English stopwords
             logger.info("Using fallback stopwords list")
-            stop_words = set(['i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', 
-                            "you're", "you've", "you'll", "you'd", 'your', 'yours', 'yourself', 
-                            'yourselves', 'he', 'him', 'his', 'himself', 'she', "she's", 'her', 
-                            'hers', 'herself', 'it', "it's", 'its', 'itself', 'they', 'them', 
-                            'their', 'theirs', 'themselves', 'what', 'which', 'who', 'whom', 
-                            'this', 'that', "that'll", 'these', 'those', 'am', 'is', 'are', 
-                            'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having', 
-                            'do', 'does', 'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if', 
-                            'or', 'because', 'as', 'until', 'while', 'of', 'at', 'by', 'for', 
-                            'with', 'about', 'against', 'between', 'into', 'through', 'during', 
-                            'before', 'after', 'above', 'below', 'to', 'from', 'up', 'down', 
-                            'in', 'out', 'on', 'off', 'over', 'under', 'again', 'further', 
-                            'then', 'once', 'here', 'there', 'when', 'where', 'why', 'how', 
-                            'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other', 
-                            'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 
-                            'than', 'too', 'very'])
-            return stop_words
-
-def extract_keywords_from_text(text, stop_words, num_keywords=5):
-    """Extract relevant keywords from text using frequency analysis."""
-    try:
+            return FALLBACK_STOP_WORDS
+
+_stop_words = None
+_stop_words_lock = threading.Lock()
+
+def get_stop_words():
+    """Return the stopword set, setting up NLTK on first use and caching the result for this process."""
+    global _stop_words
+    with _stop_words_lock:
+        if _stop_words is None:
+            try:
+                _stop_words = setup_nltk()
+            except Exception as e:
+                logger.error(f"Error setting up NLTK: {e}")
+                logger.error("Will attempt to continue with the fallback stopwords list")
+                _stop_words = FALLBACK_STOP_WORDS
+        return _stop_words
+
+def word_tokenize(text):
+    """Tokenize text with NLTK's word_tokenize, importing NLTK on first use."""
+    from nltk.tokenize import word_tokenize as nltk_word_tokenize
+    return nltk_word_tokenize(text)
+
+def _keyword_counts(text, stop_words, engine=DEFAULT_KEYWORD_ENGINE):
+    """Count the candidate keywords of text in order of first appearance.
+
+    A stop_words of None stands for the NLTK stopword list, loaded on first use.
+    """
+    if stop_words is None:
+        stop_words = get_stop_words()
+    if engine == "nltk":
         # Tokenize and filter out stopwords
         word_tokens = word_tokenize(text.lower())
         filtered_words = [w for w in word_tokens if w.isalnum() and len(w) > 3 and w not in stop_words]
         
         # Count word frequency
-        word_counter = Counter(filtered_words)
+        return Counter(filtered_words)
+    # One regex pass; the pattern already applies the alphanumeric and length rules
+    return Counter(w for w in KEYWORD_TOKEN_PATTERN.findall(text.lower()) if w not in stop_words)
+
+@METRICS.timer("keywords")
+def extract_keywords_from_text(text, stop_words, num_keywords=5, engine=DEFAULT_KEYWORD_ENGINE):
+    """Extract relevant keywords from text using frequency analysis."""
+    try:
+        word_counter = _keyword_counts(text, stop_words, engine)
         
         # Get the most common words as keywords
         keywords = [word for word, count in word_counter.most_common(num_keywords)]
@@ -109,35 +415,235 @@ def extract_keywords_from_text(text, stop_words, num_keywords=5):
         logger.error(f"Error extracting keywords: {e}")
         return []
 
-def extract_text_from_pdf_range(pdf_path, start_page, end_page, max_chars=2000):
-    """Extract text from a range of pages in a PDF."""
+@METRICS.timer("keywords")
+def extract_keywords_batch(texts, stop_words, num_keywords=5, engine=DEFAULT_KEYWORD_ENGINE):
+    """Extract keywords from many texts at once, e.g. every split of a job; returns one list per text."""
+    results = []
+    for text in texts:
+        try:
+            results.append([word for word, count in _keyword_counts(text, stop_words, engine).most_common(num_keywords)])
+        except Exception as e:
+            logger.error(f"Error extracting keywords: {e}")
+            results.append([])
+    return results
+
+def current_rss_bytes():
+    """Return this process's resident set size in bytes, or its peak if the current value is unavailable."""
     try:
-        reader = PdfReader(pdf_path)
-        text = ""
-        for i in range(start_page, min(end_page, len(reader.pages))):
-            page_text = reader.pages[i].extract_text() or ""
-            text += page_text
-            if len(text) > max_chars:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_bytes()
+
+def peak_rss_bytes():
+    """Return this process's peak resident set size in bytes, or None if it cannot be measured."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PdfDocument:
+    """A PDF parsed once and shared by folder naming, split naming and the splitter.
+
+    Page text is extracted lazily and memoized in an LRU cache bounded to
+    ``text_cache_pages`` pages so memory stays capped on very long documents.
+    With low_memory the file is memory-mapped instead of read into a buffer, and
+    ``release_objects`` drops everything the reader has resolved so far.
+    With text_workers > 1, ``prefetch_text`` extracts the text of long documents
+    across a PageTextExtractor pool, started as soon as the document is opened (not
+    in low_memory mode, where every worker parsing the file would defeat the budget).
+    """
+
+    def __init__(self, pdf_path, text_cache_pages=DEFAULT_TEXT_CACHE_PAGES, low_memory=False,
+                 text_workers=DEFAULT_TEXT_WORKERS):
+        self.pdf_path = pdf_path
+        self.low_memory = low_memory
+        self.text_workers = 1 if low_memory else max(1, text_workers)
+        self._extractor = None
+        self._file = None
+        self._mmap = None
+        if low_memory:
+            self._file = open(pdf_path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.reader = PdfReader(self._mmap)
+            text_cache_pages = min(text_cache_pages, LOW_MEMORY_TEXT_CACHE_PAGES)
+        else:
+            self.reader = PdfReader(pdf_path)
+        self.text_cache_pages = max(1, text_cache_pages)
+        self._text_cache = OrderedDict()
+        if self.text_workers > 1 and self.page_count >= TEXT_POOL_MIN_PAGES:
+            self._extractor = PageTextExtractor(pdf_path, self.text_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    @property
+    def page_count(self):
+        return len(self.reader.pages)
+
+    def page_text(self, page_num):
+        """Return the text of a single page, extracting it on first use."""
+        if page_num in self._text_cache:
+            self._text_cache.move_to_end(page_num)
+            return self._text_cache[page_num]
+
+        with METRICS.timer("text_extraction"):
+            page_text = self.reader.pages[page_num].extract_text() or ""
+        self._cache_text(page_num, page_text)
+        return page_text
+
+    def _cache_text(self, page_num, page_text):
+        self._text_cache[page_num] = page_text
+        self._text_cache.move_to_end(page_num)
+        if len(self._text_cache) > self.text_cache_pages:
+            self._text_cache.popitem(last=False)
+
+    def prefetch_text(self, requests):
+        """Extract in parallel the pages text_range will read for each (start_page, end_page, max_chars).
+
+        The text is cached for text_range and page_text. Does nothing for short documents or
+        once the text workers are stopped; stops once the cache is full.
+        """
+        if self._extractor is None:
+            return
+        requests = [(start_page, min(end_page, self.page_count), max_chars)
+                    for start_page, end_page, max_chars in requests]
+        with METRICS.timer("text_extraction"):
+            texts = self._extractor.extract(requests, known=self._text_cache,
+                                            max_pages=self.text_cache_pages - len(self._text_cache))
+        for page_num in sorted(texts):
+            self._cache_text(page_num, texts[page_num])
+
+    def text_range(self, start_page, end_page, max_chars=SPLIT_NAME_TEXT_CHARS):
+        """Return the text of pages [start_page, end_page), stopping once max_chars is exceeded."""
+        return "".join(self.page_text(i) for i in self.text_range_pages(start_page, end_page, max_chars))
+
+    def text_range_pages(self, start_page, end_page, max_chars=SPLIT_NAME_TEXT_CHARS):
+        """Return the page numbers whose text text_range joins for the same arguments."""
+        pages = []
+        chars = 0
+        for i in range(start_page, min(end_page, self.page_count)):
+            pages.append(i)
+            chars += len(self.page_text(i))
+            if chars > max_chars:
                 break
-        return text
+        return pages
+
+    def release_objects(self):
+        """Forget resolved objects and their decoded streams; they are re-read from the file on demand."""
+        self.reader.resolved_objects.clear()
+        gc.collect()
+        # Let the OS drop the file pages we touched; a read-only mapping re-reads them on access
+        if self._mmap is not None and hasattr(mmap, "MADV_DONTNEED"):
+            self._mmap.madvise(mmap.MADV_DONTNEED)
+
+    def stop_text_workers(self):
+        """Shut down the text extraction pool, if one was started; later text is extracted in-process."""
+        if self._extractor is not None:
+            self._extractor.close()
+            self._extractor = None
+
+    def close(self):
+        """Drop cached text so the parsed document can be garbage collected, and stop any text workers."""
+        self._text_cache.clear()
+        self.stop_text_workers()
+        if self._mmap is not None:
+            self.reader.resolved_objects.clear()
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+_text_reader = None
+
+def _init_text_worker(pdf_path):
+    """Parse the PDF once per text worker, memory-mapped so the workers share the file's pages."""
+    global _text_reader
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    with open(pdf_path, 'rb') as pdf_file:
+        _text_reader = PdfReader(mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+def _extract_page_text_job(page_num):
+    return _text_reader.pages[page_num].extract_text() or ""
+
+class PageTextExtractor:
+    """A pool of worker processes extracting the page text of one PDF.
+
+    ``extract`` takes (start_page, end_page, max_chars) requests and reads each range
+    from its start until its text exceeds max_chars, as PdfDocument.text_range does.
+    Pages go out in waves: every unfinished range gets its next few pages, sized so the
+    wave keeps all workers busy, and a range drops out as soon as its budget is reached.
+    """
+
+    def __init__(self, pdf_path, workers):
+        self.pdf_path = pdf_path
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_text_worker, initargs=(pdf_path,))
+        # Start the workers now, so they launch and parse the PDF while the caller is still busy
+        for _ in range(workers):
+            self._executor.submit(int)
+
+    def extract(self, requests, known=None, max_pages=None):
+        """Return {page_num: text} for the pages the requests read, besides those already in known.
+
+        Stops early once max_pages pages have been extracted.
+        """
+        known = known if known is not None else {}
+        texts = {}
+        # [next page, end page, characters still wanted] for every range not yet satisfied
+        active = [[start_page, end_page, max_chars] for start_page, end_page, max_chars in requests
+                  if start_page < end_page]
+        while active and (max_pages is None or len(texts) < max_pages):
+            share = max(1, -(-self.workers // len(active)))
+            wave = sorted({page_num for next_page, end_page, _ in active
+                           for page_num in range(next_page, min(next_page + share, end_page))
+                           if page_num not in known and page_num not in texts})
+            if max_pages is not None:
+                wave = wave[:max_pages - len(texts)]
+            chunk_pages = max(1, len(wave) // (self.workers * 4))
+            texts.update(zip(wave, self._executor.map(_extract_page_text_job, wave, chunksize=chunk_pages)))
+            
+            # Advance each range over the pages it now has, in page order, until its budget is reached
+            for state in active:
+                while state[0] < state[1] and state[2] >= 0:
+                    page_text = texts.get(state[0], known.get(state[0]))
+                    if page_text is None:
+                        break
+                    state[2] -= len(page_text)
+                    state[0] += 1
+            active = [state for state in active if state[0] < state[1] and state[2] >= 0]
+        return texts
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+def extract_text_from_pdf_range(pdf_path, start_page, end_page, max_chars=SPLIT_NAME_TEXT_CHARS, document=None):
+    """Extract text from a range of pages in a PDF."""
+    try:
+        if document is None:
+            document = PdfDocument(pdf_path)
+        return document.text_range(start_page, end_page, max_chars)
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {e}")
         return ""
 
-def generate_folder_name(pdf_path, stop_words):
+@METRICS.timer("folder_naming")
+def generate_folder_name(pdf_path, stop_words, document=None, keyword_engine=DEFAULT_KEYWORD_ENGINE):
     """Generate a folder name based on PDF content."""
     try:
-        reader = PdfReader(pdf_path)
+        if document is None:
+            document = PdfDocument(pdf_path)
         # Extract text from the first few pages
-        text = ""
-        for i in range(min(5, len(reader.pages))):
-            page_text = reader.pages[i].extract_text() or ""
-            text += page_text
-            if len(text) > 3000:  # Limit text to analyze
-                break
+        text = document.text_range(0, FOLDER_NAME_PAGES, max_chars=FOLDER_NAME_TEXT_CHARS)  # Limit text to analyze
                 
         # Extract keywords
-        kw = extract_keywords_from_text(text, stop_words)
+        kw = extract_keywords_from_text(text, stop_words, engine=keyword_engine)
         
         # Create folder name
         if kw:
@@ -161,14 +667,18 @@ def generate_folder_name(pdf_path, stop_words):
         filename = ''.join(c if c.isalnum() or c in [' ', '_', '-'] else '_' for c in filename)
         return f"{filename}_{timestamp}"
 
-def generate_split_name(pdf_path, start_page, end_page, split_num, stop_words):
-    """Generate a name for a PDF split based on its content."""
+@METRICS.timer("split_naming")
+def generate_split_name(pdf_path, start_page, end_page, split_num, stop_words, document=None,
+                        keyword_engine=DEFAULT_KEYWORD_ENGINE, keywords=None):
+    """Generate a name for a PDF split based on its content, or on keywords ranked beforehand."""
     try:
-        # Extract text from this range of pages
-        text = extract_text_from_pdf_range(pdf_path, start_page, end_page)
-        
-        # Extract keywords
-        kw = extract_keywords_from_text(text, stop_words, num_keywords=2)
+        kw = keywords
+        if kw is None:
+            # Extract text from this range of pages
+            text = extract_text_from_pdf_range(pdf_path, start_page, end_page, document=document)
+            
+            # Extract keywords
+            kw = extract_keywords_from_text(text, stop_words, num_keywords=2, engine=keyword_engine)
         
         # Create split name
         if kw:
@@ -186,383 +696,2880 @@ def generate_split_name(pdf_path, start_page, end_page, split_num, stop_words):
         # Simple fallback
         return f"{split_num:02d}_pages_{start_page+1}-{end_page}"
 
-def split_pdf_by_size(pdf_path, complete_folder, original_folder, stop_words, max_size_mb=24):
-    """Split a PDF into parts, each not exceeding max_size_mb."""
-    try:
-        # Create a folder for the splits
-        folder_name = generate_folder_name(pdf_path, stop_words)
-        output_folder = os.path.join(complete_folder, folder_name)
-        os.makedirs(output_folder, exist_ok=True)
-        
-        reader = PdfReader(pdf_path)
-        total_pages = len(reader.pages)
-        
-        if total_pages == 0:
-            logger.warning(f"PDF has no pages: {pdf_path}")
-            return False
-        
-        # Estimate average page size
-        pdf_size = os.path.getsize(pdf_path)
-        avg_page_size = pdf_size / total_pages
-        
-        # Use a conservative target size (20MB) to ensure we stay under the limit
-        target_size_mb = min(20, max_size_mb - 4)
-        logger.info(f"Using target size of {target_size_mb}MB to ensure final size is under {max_size_mb}MB")
-        
-        split_num = 1
-        start_page = 0
-        
-        while start_page < total_pages:
-            # Initial estimate of pages per chunk (conservative)
-            estimated_pages = max(1, int(target_size_mb * 1024 * 1024 / avg_page_size))
-            end_page = min(start_page + estimated_pages, total_pages)
-            
-            # For very large pages, we might need to include just one page
-            if end_page == start_page:
-                end_page = start_page + 1
-            
-            logger.info(f"Creating split {split_num} with pages {start_page+1} to {end_page}")
-            
-            # Create a temporary writer for the current chunk
-            writer = PdfWriter()
-            
-            # Add pages to the writer
-            for page_num in range(start_page, end_page):
-                writer.add_page(reader.pages[page_num])
-            
-            # Create a temporary file to check the actual size
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-                temp_path = temp_file.name
-            
-            # Write to the temporary file
-            with open(temp_path, 'wb') as output_file:
-                writer.write(output_file)
-            
-            # Check the actual file size
-            actual_size_mb = os.path.getsize(temp_path) / (1024 * 1024)
-            logger.info(f"Split {split_num} actual size: {actual_size_mb:.2f}MB")
-            
-            # If the file is too large and contains more than one page, reduce the page count
-            if actual_size_mb > max_size_mb and end_page - start_page > 1:
-                logger.warning(f"Split {split_num} exceeds {max_size_mb}MB ({actual_size_mb:.2f}MB), reducing page count")
-                
-                # Remove the temporary file
-                os.unlink(temp_path)
-                
-                # Binary search to find the right number of pages
-                min_pages = 1
-                max_pages = end_page - start_page - 1
-                
-                while min_pages <= max_pages:
-                    mid_pages = (min_pages + max_pages) // 2
-                    test_end_page = start_page + mid_pages
-                    
-                    # Create test writer
-                    test_writer = PdfWriter()
-                    for page_num in range(start_page, test_end_page):
-                        test_writer.add_page(reader.pages[page_num])
-                    
-                    # Create a temporary file for the test
-                    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as test_temp_file:
-                        test_temp_path = test_temp_file.name
-                    
-                    # Write to the test file
-                    with open(test_temp_path, 'wb') as test_output_file:
-                        test_writer.write(test_output_file)
-                    
-                    # Check the test file size
-                    test_size_mb = os.path.getsize(test_temp_path) / (1024 * 1024)
-                    
-                    # Clean up the test file
-                    os.unlink(test_temp_path)
-                    
-                    if test_size_mb <= max_size_mb:
-                        min_pages = mid_pages + 1
-                    else:
-                        max_pages = mid_pages - 1
-                
-                # Use the result of the binary search
-                end_page = start_page + max_pages
-                
-                # If we couldn't reduce enough (e.g., a single page is too large), handle it
-                if end_page <= start_page:
-                    logger.warning(f"Cannot split page {start_page+1} to be under {max_size_mb}MB")
-                    end_page = start_page + 1
-                
-                # Recreate the writer with the correct page count
-                writer = PdfWriter()
-                for page_num in range(start_page, end_page):
-                    writer.add_page(reader.pages[page_num])
-                
-                # Create a new temporary file
-                with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-                    temp_path = temp_file.name
-                
-                # Write to the temporary file
-                with open(temp_path, 'wb') as output_file:
-                    writer.write(output_file)
-                
-                # Update actual size for logging
-                actual_size_mb = os.path.getsize(temp_path) / (1024 * 1024)
-                logger.info(f"Adjusted split {split_num} with pages {start_page+1} to {end_page}, size: {actual_size_mb:.2f}MB")
-            
-            # Generate a name for the split
-            split_name = generate_split_name(pdf_path, start_page, end_page, split_num, stop_words)
-            output_path = os.path.join(output_folder, f"{split_name}.pdf")
-            
-            # Move the temporary file to the final location
-            shutil.move(temp_path, output_path)
-            
-            logger.info(f"Created split {split_num}: {output_path} ({actual_size_mb:.2f}MB)")
-            
-            # Move to the next split
-            start_page = end_page
-            split_num += 1
-        
-        # Move the original PDF to the completed folder
-        os.makedirs(original_folder, exist_ok=True)
-        dest_path = os.path.join(original_folder, os.path.basename(pdf_path))
-        
-        # If the destination file already exists, add a timestamp
-        if os.path.exists(dest_path):
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename, ext = os.path.splitext(os.path.basename(pdf_path))
-            dest_path = os.path.join(original_folder, f"{filename}_{timestamp}{ext}")
-        
-        shutil.move(pdf_path, dest_path)
-        logger.info(f"Moved original PDF to: {dest_path}")
-        
-        return True
-    except Exception as e:
-        logger.error(f"Error splitting PDF: {e}", exc_info=True)
-        return False
+class ByteCountingSink:
+    """A write-only stream that counts the bytes written to it and stores nothing.
 
-class PDFHandler(FileSystemEventHandler):
-    def __init__(self, complete_folder, original_folder, stop_words):
-        self.complete_folder = complete_folder
-        self.original_folder = original_folder
-        self.stop_words = stop_words
-        
-    def on_created(self, event):
-        if not event.is_directory and event.src_path.lower().endswith('.pdf'):
-            logger.info(f"New PDF detected: {event.src_path}")
-            
-            # Add a small delay to ensure the file is fully written
-            time.sleep(2)
-            
-            # Check if the file is still there (it might have been moved by another process)
-            if not os.path.exists(event.src_path):
-                logger.warning(f"File no longer exists: {event.src_path}")
-                return
-            
-            # Check if the file is still being written to
-            try:
-                size1 = os.path.getsize(event.src_path)
-                time.sleep(1)
-                size2 = os.path.getsize(event.src_path)
-                
-                if size1 != size2:
-                    logger.info(f"File is still being written, waiting...")
-                    time.sleep(2)  # Wait a bit longer
-            except Exception as e:
-                logger.warning(f"Error checking file stability: {e}")
-            
-            # Process the PDF
-            split_pdf_by_size(event.src_path, self.complete_folder, self.original_folder, self.stop_words)
+    Used to probe how large a PdfWriter's output would be without touching the disk.
+    """
 
-def create_autorun_setup():
-    """Create batch files for autorun setup."""
-    # Create autorun.bat for Windows
-    batch_content = """@echo off
-echo Setting up PDF Splitter to run automatically...
+    def __init__(self):
+        self.size = 0
 
-:: Create a shortcut in the startup folder
-powershell "$WshShell = New-Object -ComObject WScript.Shell; $Shortcut = $WshShell.CreateShortcut('%APPDATA%\\Microsoft\\Windows\\Start Menu\\Programs\\Startup\\PDF Splitter.lnk'); $Shortcut.TargetPath = '%~dp0start_pdf_splitter.bat'; $Shortcut.WorkingDirectory = '%~dp0'; $Shortcut.Description = 'Start PDF Splitter'; $Shortcut.Save()"
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
 
-echo Created startup shortcut. PDF Splitter will now run automatically when you log in.
+    def tell(self):
+        return self.size
 
-:: Start the script now
-start "" "%~dp0start_pdf_splitter.bat"
+    def flush(self):
+        pass
 
-echo PDF Splitter is now running.
-pause
-"""
-    setup_autorun_path = get_absolute_path("setup_autorun.bat")
-    with open(setup_autorun_path, 'w') as f:
-        f.write(batch_content)
-    logger.info(f"Created setup_autorun.bat at {setup_autorun_path}")
+@METRICS.timer("probe")
+def measure_pdf_size(writer):
+    """Return the size in bytes of a PdfWriter's output without writing it anywhere."""
+    sink = ByteCountingSink()
+    writer.write(sink)
+    return sink.size
+
+def build_split_writer(reader, start_page, end_page, optimize=False):
+    """Create a PdfWriter holding pages [start_page, end_page) of reader, optionally optimized."""
+    writer = PdfWriter()
+    for page_num in range(start_page, end_page):
+        writer.add_page(reader.pages[page_num])
+    if optimize:
+        optimize_split_writer(writer)
+    return writer
+
+def _used_resource_names(page):
+    """Return the resource names a page's content streams refer to, or None if pruning is unsafe."""
+    try:
+        contents = page.get("/Contents")
+        streams = [] if contents is None else contents.get_object()
+        if not isinstance(streams, ArrayObject):
+            streams = [streams]
+        used = set()
+        for stream in streams:
+            data = stream.get_object().get_data()
+            used.update(name.decode("latin-1") for name in RESOURCE_NAME_PATTERN.findall(data))
+    except Exception as e:
+        logger.debug(f"Not pruning resources, content could not be read: {e}")
+        return None
     
-    # Create start script
-    start_content = """@echo off
-echo Starting PDF Splitter...
-"%~dp0venv\\Scripts\\pythonw.exe" "%~dp0pdf_splitter.py"
-echo PDF Splitter is running in the background.
-"""
-    start_pdf_splitter_path = get_absolute_path("start_pdf_splitter.bat")
-    with open(start_pdf_splitter_path, 'w') as f:
-        f.write(start_content)
-    logger.info(f"Created start_pdf_splitter.bat at {start_pdf_splitter_path}")
+    # Names with #xx escapes cannot be matched reliably against resource keys
+    if any("#" in name for name in used):
+        return None
     
-    # Create README
-    readme_content = """# PDF Splitter
+    # Form XObjects without resources of their own draw with the page's resources
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources is not None else None
+    if xobjects is not None:
+        for name, xobject in xobjects.get_object().items():
+            xobject = xobject.get_object()
+            if name in used and xobject.get("/Subtype") == "/Form" and "/Resources" not in xobject:
+                return None
+    return used
 
-This tool automatically splits PDFs into smaller files (max 24MB) when they are dropped into the "PDF Split Drop" folder.
+def _pruned_resources(resources, used):
+    """Return a copy of a resource dictionary holding only the names in used."""
+    pruned = DictionaryObject()
+    for category, entries in resources.items():
+        entries_obj = entries.get_object()
+        if isinstance(entries_obj, DictionaryObject) and not isinstance(entries_obj, StreamObject):
+            pruned[category] = DictionaryObject({name: value for name, value in entries_obj.items() if name in used})
+        else:
+            pruned[category] = entries
+    return pruned
 
-## Setup
+def _is_compressible(obj):
+    """Return True for a stream stored without any filter that is worth Flate-compressing."""
+    return (isinstance(obj, StreamObject)
+            and "/Filter" not in obj
+            and "/DecodeParms" not in obj
+            and obj.get("/Type") != "/Metadata"
+            and len(obj._data) >= MIN_COMPRESS_BYTES)
 
-1. Make sure you have Python installed
-2. Run `setup.py` to create the virtual environment and install dependencies
-3. Run `setup_autorun.bat` to make the script run automatically on startup
+def _flate_compress(data):
+    """Return data Flate-compressed, or None if compressing would not make it smaller."""
+    # Skip data that does not compress, such as raw photographs, without compressing all of it
+    if len(data) > COMPRESS_SAMPLE_BYTES:
+        sample = data[:COMPRESS_SAMPLE_BYTES]
+        if len(zlib.compress(sample)) > len(sample) * COMPRESS_SAMPLE_RATIO:
+            return None
+    compressed = zlib.compress(data)
+    return compressed if len(compressed) < len(data) else None
 
-## Usage
+def _object_digest(obj):
+    """Return a digest of an object's serialized form, used to find identical objects."""
+    stream = io.BytesIO()
+    if isinstance(obj, StreamObject):
+        DictionaryObject.write_to_stream(obj, stream, None)
+    else:
+        obj.write_to_stream(stream, None)
+    digest = hashlib.sha256(type(obj).__name__.encode())
+    digest.update(stream.getvalue())
+    if isinstance(obj, StreamObject):
+        digest.update(b"\0stream\0")
+        digest.update(obj._data)
+    return digest.digest()
 
-Simply drop any PDF file into the "PDF Split Drop" folder. The tool will:
+def _drop_unreachable_objects(writer):
+    """Replace writer objects no longer reachable from the catalog or info dictionary with null."""
+    reachable = set()
+    stack = [writer._root, writer._info]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, IndirectObject):
+            if item.pdf is not writer or item.idnum in reachable:
+                continue
+            reachable.add(item.idnum)
+            item = writer._objects[item.idnum - 1]
+        if isinstance(item, DictionaryObject):
+            stack.extend(item.values())
+        elif isinstance(item, ArrayObject):
+            stack.extend(item)
+    
+    dropped = 0
+    for index, obj in enumerate(writer._objects):
+        if index + 1 not in reachable and obj is not None and not isinstance(obj, NullObject):
+            writer._objects[index] = NullObject()
+            dropped += 1
+    return dropped
 
-1. Automatically detect the new PDF
-2. Split it into files under 24MB each
-3. Create a new folder with a name based on the PDF content
-4. Name each split with a number and content-relevant keywords
-5. Move the original PDF to the "Original PDF" folder
+def _rewrite_references(writer, remap):
+    """Point every reference to an object number in remap at its replacement."""
+    for obj in writer._objects:
+        stack = [obj]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, DictionaryObject):
+                entries = list(item.items())
+            elif isinstance(item, ArrayObject):
+                entries = list(enumerate(item))
+            else:
+                continue
+            for key, value in entries:
+                if isinstance(value, IndirectObject):
+                    if value.pdf is writer and value.idnum in remap:
+                        item[key] = IndirectObject(remap[value.idnum], 0, writer)
+                elif isinstance(value, (DictionaryObject, ArrayObject)):
+                    stack.append(value)
 
-All split files will be in the "Split Drop Complete" folder.
+def _merge_identical_objects(writer):
+    """Merge writer objects that serialize identically, returning how many were removed.
 
-## Manual Start
+    PyPDF2 only shares objects that come from the same source object, so fonts and
+    images embedded once per page end up in a split many times over. Merging one
+    level can make their parents identical too, so this repeats until nothing changes.
+    """
+    # Pages and the document structure must stay distinct objects
+    keep = {writer._root.idnum, writer._info.idnum, writer._pages.idnum}
+    merged = 0
+    while True:
+        canonical = {}
+        remap = {}
+        for index, obj in enumerate(writer._objects):
+            idnum = index + 1
+            if obj is None or isinstance(obj, NullObject) or idnum in keep:
+                continue
+            if isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page":
+                continue
+            digest = _object_digest(obj)
+            if digest in canonical:
+                remap[idnum] = canonical[digest]
+            else:
+                canonical[digest] = idnum
+        if not remap:
+            return merged
+        _rewrite_references(writer, remap)
+        for idnum in remap:
+            writer._objects[idnum - 1] = NullObject()
+        merged += len(remap)
 
-If you don't want the tool to run automatically, you can start it manually by running `start_pdf_splitter.bat`.
+def _compress_streams(writer):
+    """Flate-compress unfiltered streams where that makes them smaller, returning how many were."""
+    compressed = 0
+    for index, obj in enumerate(writer._objects):
+        if not _is_compressible(obj):
+            continue
+        data = _flate_compress(obj._data)
+        if data is None:
+            continue
+        encoded = EncodedStreamObject()
+        for key, value in obj.items():
+            encoded[key] = value
+        encoded[NameObject("/Filter")] = NameObject("/FlateDecode")
+        encoded._data = data
+        writer._objects[index] = encoded
+        compressed += 1
+    return compressed
 
-## Troubleshooting
+@METRICS.timer("optimize")
+def optimize_split_writer(writer):
+    """Shrink a split in place before it is written.
 
-If you encounter issues:
+    Each page keeps only the resources its content uses, objects no longer reachable
+    are dropped, identical objects are merged and unfiltered streams are compressed.
+    PyPDF2 numbers objects by their position, so removed objects are written as null.
+    """
+    for page in writer.pages:
+        used = _used_resource_names(page)
+        resources = page.get("/Resources")
+        if used is not None and resources is not None:
+            page[NameObject("/Resources")] = _pruned_resources(resources.get_object(), used)
+    
+    METRICS.increment("objects_dropped", _drop_unreachable_objects(writer))
+    METRICS.increment("objects_deduplicated", _merge_identical_objects(writer))
+    METRICS.increment("streams_compressed", _compress_streams(writer))
 
-1. Check the pdf_splitter.log file for error messages
-2. Make sure all folders exist and are accessible
-3. Ensure NLTK data is downloaded by running: `python -c "import nltk; nltk.download('punkt'); nltk.download('stopwords')"`
-"""
-    readme_path = get_absolute_path("README.md")
-    with open(readme_path, 'w') as f:
-        f.write(readme_content)
-    logger.info(f"Created README.md at {readme_path}")
-    
-    # Create setup.py
-    setup_content = """import os
-import subprocess
-import sys
-import venv
+def _publish_split(output_path, write_to):
+    """Write a split with write_to(file) under a temporary name, fsync it and move it into place."""
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'wb') as output_file:
+        write_to(output_file)
+        size = output_file.tell()
+        output_file.flush()
+        os.fsync(output_file.fileno())
+    os.replace(temp_path, output_path)
+    METRICS.increment("split_bytes_written", size)
+    return size
 
-def main():
-    print("Setting up PDF Splitter...")
-    
-    # Create virtual environment
-    venv_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "venv")
-    print(f"Creating virtual environment in {venv_dir}")
-    venv.create(venv_dir, with_pip=True)
-    
-    # Determine python executable path
-    if os.name == 'nt':  # Windows
-        python_executable = os.path.join(venv_dir, "Scripts", "python.exe")
-        pip_executable = os.path.join(venv_dir, "Scripts", "pip.exe")
-    else:  # Unix/Linux
-        python_executable = os.path.join(venv_dir, "bin", "python")
-        pip_executable = os.path.join(venv_dir, "bin", "pip")
-    
-    # Install dependencies
-    print("Installing required packages...")
-    subprocess.check_call([pip_executable, "install", "PyPDF2", "watchdog", "nltk"])
-    
-    # Create required folders
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    os.makedirs(os.path.join(base_dir, "PDF Split Drop"), exist_ok=True)
-    os.makedirs(os.path.join(base_dir, "PDF Split Drop", "Split Drop Complete"), exist_ok=True)
-    os.makedirs(os.path.join(base_dir, "PDF Split Drop", "Original PDF"), exist_ok=True)
-    
-    # Download NLTK data
-    print("Downloading NLTK data...")
-    subprocess.check_call([
-        python_executable, "-c", 
-        "import nltk; nltk.download('punkt'); nltk.download('stopwords')"
-    ])
-    
-    print("Setup complete!")
-    print("You can now run setup_autorun.bat to make the script start automatically on system startup")
-    print("Or run start_pdf_splitter.bat to start it manually")
+@METRICS.timer("write")
+def write_split(writer, output_path):
+    """Write a split durably to its final location and return its size in bytes."""
+    return _publish_split(output_path, writer.write)
 
-if __name__ == "__main__":
-    main()
-"""
-    setup_path = get_absolute_path("setup.py")
-    with open(setup_path, 'w') as f:
-        f.write(setup_content)
-    logger.info(f"Created setup.py at {setup_path}")
+@METRICS.timer("serialize")
+def serialize_split(writer):
+    """Return a split's PDF bytes, serialized in memory."""
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
 
-def parse_arguments():
-    """Parse command line arguments."""
-    parser = argparse.ArgumentParser(description="PDF Splitter - Split PDFs into smaller files")
-    parser.add_argument("--drop-folder", help="Path to folder where PDFs will be dropped",
-                        default=DEFAULT_DROP_FOLDER)
-    parser.add_argument("--complete-folder", help="Path to folder where split PDFs will be stored",
-                        default=DEFAULT_COMPLETE_FOLDER)
-    parser.add_argument("--original-folder", help="Path to folder where original PDFs will be moved",
-                        default=DEFAULT_ORIGINAL_FOLDER)
-    parser.add_argument("--max-size", type=int, default=24,
-                        help="Maximum size in MB for split files (default: 24)")
-    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
-    return parser.parse_args()
+def _fsync_path(path):
+    """Flush a file or folder's data and metadata to disk."""
+    fd = os.open(path, os.O_RDONLY if os.path.isdir(path) else os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
-def main():
-    # Parse command line arguments
-    args = parse_arguments()
-    
-    # Set up logging level
-    if args.debug:
-        logging.getLogger().setLevel(logging.DEBUG)
-        logger.debug("Debug logging enabled")
-    
-    # Set up the folders
-    drop_folder = args.drop_folder
-    complete_folder = args.complete_folder
-    original_folder = args.original_folder
-    max_size = args.max_size
-    
-    logger.info(f"Starting PDF Splitter with max size: {max_size}MB")
-    logger.info(f"Drop folder: {drop_folder}")
-    logger.info(f"Complete folder: {complete_folder}")
-    logger.info(f"Original folder: {original_folder}")
-    
-    # Create the folders if they don't exist
-    os.makedirs(drop_folder, exist_ok=True)
-    os.makedirs(complete_folder, exist_ok=True)
-    os.makedirs(original_folder, exist_ok=True)
-    
-    # Set up NLTK and get stopwords
+def _fsync_folder(folder):
+    """Make the entries of a folder durable; skipped where folders cannot be opened (Windows)."""
     try:
-        stop_words = setup_nltk()
-    except Exception as e:
-        logger.error(f"Error setting up NLTK: {e}")
-        logger.error("Will attempt to continue with a minimal stopwords list")
-        # Basic fallback
-        stop_words = set(['a', 'an', 'the', 'and', 'or', 'but', 'if', 'then', 'else', 'when', 'where', 'why', 'how'])
-    
-    # Create helper scripts for auto-start
-    create_autorun_setup()
-    
-    print(f"PDF Splitter started. Watching for PDFs in: {drop_folder}")
-    print(f"Splits will be saved to: {complete_folder}")
-    print(f"Original PDFs will be moved to: {original_folder}")
-    print(f"Maximum split size: {max_size}MB")
-    
-    # Set up the file system observer
-    event_handler = PDFHandler(complete_folder, original_folder, stop_words)
-    observer = Observer()
-    observer.schedule(event_handler, drop_folder, recursive=False)
-    observer.start()
-    
+        _fsync_path(folder)
+    except PermissionError:
+        pass
+
+def published_path(path):
+    """Return where a file written into a staging folder will be once its folder is published."""
+    folder = os.path.dirname(path)
+    staging = os.path.dirname(folder)
+    if os.path.basename(staging) != STAGING_FOLDER:
+        return path
+    return os.path.join(os.path.dirname(staging), os.path.basename(folder), os.path.basename(path))
+
+def _suffixed_names(folder_name):
+    """Yield folder_name, then folder_name_2, folder_name_3, ... for picking a free folder name."""
+    yield folder_name
+    suffix = 2
+    while True:
+        yield f"{folder_name}_{suffix}"
+        suffix += 1
+
+def _folder_owner(folder):
+    """Return the job that owns an output folder: its owner marker, else its manifest's content hash."""
+    try:
+        with open(os.path.join(folder, OWNER_FILENAME)) as f:
+            return f.read()
+    except OSError:
+        pass
     try:
-        # Process any existing PDF files in the drop folder
-        for filename in os.listdir(drop_folder):
-            if filename.lower().endswith('.pdf'):
-                pdf_path = os.path.join(drop_folder, filename)
-                logger.info(f"Found existing PDF in drop folder: {pdf_path}")
-                split_pdf_by_size(pdf_path, complete_folder, original_folder, stop_words, max_size)
+        with open(os.path.join(folder, MANIFEST_FILENAME)) as f:
+            return json.load(f).get("content_hash")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class OutputCommitter:
+    """Stages a document's output folder next to its final location and publishes it in one step.
+
+    Outputs are written into ``<complete_folder>/.staging/<folder_name>``, on the same
+    filesystem as the final folder, so nothing is copied on the way. Staged files are
+    not fsynced one by one: ``sync`` flushes everything written since the last call in
+    one pass, and ``publish`` syncs the rest and renames the staging folder into the
+    complete folder, so readers see the whole document folder or none of it.
+    Committers come from ``reserve``, which claims a folder name no other job is
+    using, or from ``resume``, which only reopens a folder its owner reserved.
+    """
+
+    def __init__(self, complete_folder, folder_name, published=False, base_name=None):
+        self.complete_folder = complete_folder
+        self.folder_name = folder_name
+        self.base_name = base_name or folder_name
+        self.final_folder = os.path.join(complete_folder, folder_name)
+        self.staging_folder = os.path.join(complete_folder, STAGING_FOLDER, folder_name)
+        self.published = published
+        self.unsynced_bytes = 0
+        self._unsynced = []
+
+    @classmethod
+    def reserve(cls, complete_folder, folder_name, owner=None):
+        """Claim an unused output folder named folder_name, or folder_name_2, _3, ... if it is taken.
+
+        The staging folder is created with os.mkdir, which fails if another job got there
+        first, so two jobs never share a folder. With an owner, it is recorded in the
+        folder so the job can resume into it later.
+        """
+        os.makedirs(os.path.join(complete_folder, STAGING_FOLDER), exist_ok=True)
+        for candidate in _suffixed_names(folder_name):
+            if not os.path.exists(os.path.join(complete_folder, candidate)):
+                try:
+                    os.mkdir(os.path.join(complete_folder, STAGING_FOLDER, candidate))
+                    break
+                except FileExistsError:
+                    pass
+        committer = cls(complete_folder, candidate, base_name=folder_name)
+        if owner is not None:
+            write_text_atomic(os.path.join(committer.staging_folder, OWNER_FILENAME), owner)
+        return committer
+
+    @classmethod
+    def resume(cls, complete_folder, folder_name, owner):
+        """Reopen a folder reserved by owner, staged or already published; None if owner does not own it.
+
+        A staged folder is recognized by its owner marker. Published folders carry no
+        marker, so they are recognized by the content hash in their manifest instead.
+        """
+        committer = cls(complete_folder, folder_name)
+        for folder, published in ((committer.staging_folder, False), (committer.final_folder, True)):
+            if _folder_owner(folder) == owner:
+                committer.published = published
+                return committer
+        return None
+
+    @classmethod
+    def replacing(cls, output_folder):
+        """Stage a new version of a published folder, to be swapped in for it by ``replace``."""
+        complete_folder, folder_name = os.path.split(os.path.abspath(output_folder))
+        committer = cls(complete_folder, folder_name)
+        committer.staging_folder = os.path.join(complete_folder, STAGING_FOLDER, folder_name + REPLACEMENT_SUFFIX)
+        if os.path.isdir(committer.staging_folder):
+            logger.info(f"Removing an unfinished replacement of {output_folder}: {committer.staging_folder}")
+            shutil.rmtree(committer.staging_folder)
+        os.makedirs(committer.staging_folder)
+        return committer
+
+    @staticmethod
+    def recover_replaced(output_folder):
+        """Finish or undo a replacement of output_folder interrupted while it was being swapped in.
+
+        The old folder is restored if the crash came before the new one was in place, and
+        deleted if it came after.
+        """
+        complete_folder, folder_name = os.path.split(os.path.abspath(output_folder))
+        replaced = os.path.join(complete_folder, STAGING_FOLDER, folder_name + REPLACED_SUFFIX)
+        if not os.path.isdir(replaced):
+            return
+        if os.path.exists(output_folder):
+            shutil.rmtree(replaced)
+        else:
+            logger.warning(f"Restoring {output_folder}, whose replacement was interrupted")
+            os.rename(replaced, output_folder)
+            _fsync_folder(complete_folder)
+
+    @property
+    def folder(self):
+        """The folder outputs are written to: the staging folder until the document is published."""
+        return self.final_folder if self.published else self.staging_folder
+
+    @METRICS.timer("write")
+    def write(self, output_path, data):
+        """Write a serialized split without syncing it and return its size in bytes."""
+        with open(output_path, 'wb') as output_file:
+            output_file.write(data)
+        METRICS.increment("split_bytes_written", len(data))
+        self.track(output_path, len(data))
+        return len(data)
+
+    def track(self, output_path, size):
+        """Include a file written into the folder some other way in the next sync."""
+        self._unsynced.append(output_path)
+        self.unsynced_bytes += size
+
+    @METRICS.timer("fsync")
+    def sync(self):
+        """Make every file written since the last sync durable, together with the folder's entries."""
+        if not self._unsynced:
+            return
+        for path in self._unsynced:
+            _fsync_path(path)
+        _fsync_folder(self.folder)
+        self._unsynced = []
+        self.unsynced_bytes = 0
+
+    def publish(self):
+        """Sync the remaining outputs and move the staging folder to its final name; returns that name.
+
+        Never replaces an existing folder: if another job, a duplicate or a user took the
+        final name after it was reserved, the folder is published under the next free
+        suffix instead, and folder_name and final_folder are updated to match.
+        """
+        self.sync()
+        # Renames into the folder made outside the committer (e.g. by parallel split writers)
+        # must be durable before the folder itself is renamed, even if nothing was left to sync
+        _fsync_folder(self.folder)
+        if not self.published:
+            # The owner marker only matters while the folder is staged; published folders are
+            # matched to their job by the manifest
+            try:
+                os.unlink(os.path.join(self.staging_folder, OWNER_FILENAME))
+            except FileNotFoundError:
+                pass
+            names = _suffixed_names(self.base_name)
+            while not self._rename_to(self.final_folder):
+                logger.warning(f"{self.final_folder} already exists, publishing under the next free name")
+                # Names other jobs have reserved are skipped too
+                self.folder_name = next(name for name in names
+                                        if not os.path.exists(os.path.join(self.complete_folder, name))
+                                        and not os.path.exists(os.path.join(self.complete_folder, STAGING_FOLDER, name)))
+                self.final_folder = os.path.join(self.complete_folder, self.folder_name)
+            _fsync_folder(self.complete_folder)
+            self.published = True
+            logger.info(f"Published {self.final_folder}")
+        return self.final_folder
+
+    def replace(self):
+        """Sync the staged folder and swap it in for the published folder of the same name.
+
+        The old folder is first moved aside into the staging folder and deleted once the
+        new one is in place; recover_replaced cleans up after a crash in between.
+        """
+        self.sync()
+        _fsync_folder(self.folder)
+        replaced = os.path.join(self.complete_folder, STAGING_FOLDER, self.folder_name + REPLACED_SUFFIX)
+        os.rename(self.final_folder, replaced)
+        try:
+            os.rename(self.staging_folder, self.final_folder)
+        except OSError:
+            os.rename(replaced, self.final_folder)
+            raise
+        _fsync_folder(self.complete_folder)
+        self.published = True
+        logger.info(f"Replaced {self.final_folder}")
+        shutil.rmtree(replaced)
+        return self.final_folder
+
+    def add_existing(self, source, target, size, link=True):
+        """Hard-link (or copy) an existing file into the folder; a failed hard link falls back to a copy."""
+        if link:
+            try:
+                os.link(source, target)
+                self.track(target, 0)
+                return
+            except OSError as e:
+                logger.warning(f"Could not hard-link {source}, copying instead: {e}")
+        shutil.copy2(source, target)
+        self.track(target, size)
+
+    def _rename_to(self, final_folder):
+        """Rename the staging folder to final_folder unless something is already there; True if it moved.
+
+        os.rename refuses an existing target on Windows, and a non-empty one on POSIX; the
+        existence check keeps an empty folder made by someone else from being replaced.
+        """
+        if os.path.exists(final_folder):
+            return False
+        try:
+            os.rename(self.staging_folder, final_folder)
+        except OSError as e:
+            if e.errno in (errno.EEXIST, errno.ENOTEMPTY):
+                return False
+            raise
+        return True
+
+class SplitFinisher:
+    """Writes serialized splits on a background thread while the next split is being built.
+
+    Splits handed to ``write`` go through a bounded queue and are written in order
+    into the committer's staging folder. Callbacks handed to ``then`` are held until
+    the writes queued before them are fsynced, which happens in batches of
+    sync_bytes and when the finisher closes, so a range is only checkpointed once its
+    files are on disk. File I/O releases the GIL, so disk and CPU are busy at the
+    same time. The first error is raised again in the thread using the finisher.
+    """
+
+    def __init__(self, committer, depth=DEFAULT_PIPELINE_DEPTH, sync_bytes=FSYNC_BATCH_BYTES):
+        self.committer = committer
+        self.sync_bytes = sync_bytes
+        self._callbacks = []
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="pdf-finisher", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._queue.put(None)
+        self._thread.join()
+        if exc_type is None:
+            self._raise_error()
+
+    def write(self, output_path, data):
+        self._put((output_path, data))
+
+    def then(self, callback):
+        self._put((None, callback))
+
+    def _put(self, item):
+        self._raise_error()
+        with METRICS.timer("pipeline_wait"):
+            self._queue.put(item)
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _sync(self):
+        """fsync the splits written so far, then run the callbacks that were waiting for them."""
+        self.committer.sync()
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            # After a failure keep draining so the producer never blocks on a full queue
+            if self._error is not None:
+                if item is None:
+                    break
+                continue
+            try:
+                if item is None:
+                    self._sync()
+                    break
+                output_path, payload = item
+                if output_path is None:
+                    self._callbacks.append(payload)
+                    if self.committer.unsynced_bytes >= self.sync_bytes:
+                        self._sync()
+                else:
+                    self.committer.write(output_path, payload)
+            except Exception as e:
+                self._error = e
+
+def _serialized_size(obj):
+    """Return the number of bytes a PDF object serializes to, without following indirect references."""
+    stream = ByteCountingSink()
+    if isinstance(obj, StreamObject):
+        # Measure the dictionary alone and add the raw stream data to avoid copying it
+        DictionaryObject.write_to_stream(obj, stream, None)
+        return stream.tell() + len(obj._data) + len(b"\nstream\n\nendstream")
+    obj.write_to_stream(stream, None)
+    return stream.tell()
+
+def _optimized_cost(obj):
+    """Return the key and cost in bytes of an object in a split written with optimize.
+
+    Streams are keyed by their content, so identical copies merged by the optimizer
+    are counted once per split, and unfiltered streams are costed compressed.
+    """
+    size = _serialized_size(obj) + PDF_OBJECT_OVERHEAD
+    if not isinstance(obj, StreamObject):
+        return None, size
+    compressed = _flate_compress(obj._data) if _is_compressible(obj) else None
+    if compressed is not None:
+        size -= len(obj._data) - len(compressed)
+    return _object_digest(obj), size
+
+def estimate_page_cost(page, optimize=False, memo=None):
+    """Estimate the serialized cost of a page as a mapping of object key to bytes.
+
+    The page dictionary itself is keyed by None since every split gets its own copy.
+    Content streams, fonts, images and other XObjects are keyed by their indirect
+    reference so that resources shared between pages can be counted once per split.
+    With optimize, the estimate follows optimize_split_writer; memo caches the
+    optimized cost of objects shared between pages.
+    """
+    page_ref = page.indirect_reference
+    seen = {(page_ref.idnum, page_ref.generation)} if page_ref is not None else set()
+    costs = {None: _serialized_size(page) + PDF_OBJECT_OVERHEAD}
+    stack = [value for key, value in page.items() if key not in ("/Parent", "/Resources")]
+    
+    # With optimize, only the resources the page's content uses are copied into the page
+    resources = page.get("/Resources")
+    used = _used_resource_names(page) if optimize and resources is not None else None
+    if used is not None:
+        resources = _pruned_resources(resources.get_object(), used)
+        costs[None] += _serialized_size(resources)
+    if resources is not None:
+        stack.append(resources)
+
+    while stack:
+        item = stack.pop()
+        if isinstance(item, IndirectObject):
+            key = (item.idnum, item.generation)
+            if key in seen:
+                continue
+            seen.add(key)
+            obj = item.get_object()
+            # Links and annotations may point at other pages; those are costed on their own
+            if isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page":
+                continue
+            if optimize:
+                if memo is None or key not in memo:
+                    cost_key, cost = _optimized_cost(obj)
+                    memo_entry = (cost_key or key, cost)
+                    if memo is not None:
+                        memo[key] = memo_entry
+                else:
+                    memo_entry = memo[key]
+                costs[memo_entry[0]] = memo_entry[1]
+            else:
+                costs[key] = _serialized_size(obj) + PDF_OBJECT_OVERHEAD
+            item = obj
+        if isinstance(item, DictionaryObject):
+            stack.extend(value for key, value in item.items() if key != "/Parent")
+        elif isinstance(item, ArrayObject):
+            stack.extend(item)
+    return costs
+
+@METRICS.timer("cost_model")
+def estimate_page_costs(reader, low_memory=False, optimize=False):
+    """Estimate the serialized cost of every page in a PDF.
+
+    With low_memory, objects resolved for a page are released before the next one,
+    so images are not all held in memory at once. With optimize, pages are costed
+    as optimize_split_writer will write them.
+    """
+    page_costs = []
+    memo = {}
+    for page in reader.pages:
+        page_costs.append(estimate_page_cost(page, optimize=optimize, memo=memo))
+        if low_memory:
+            reader.resolved_objects.clear()
+            if isinstance(reader.stream, mmap.mmap) and hasattr(mmap, "MADV_DONTNEED"):
+                reader.stream.madvise(mmap.MADV_DONTNEED)
+    return page_costs
+
+def plan_split_end(page_costs, start_page, max_bytes):
+    """Return the end page of the split starting at start_page, packing pages greedily under max_bytes."""
+    split_objects = set()
+    split_size = PDF_FILE_OVERHEAD
+    end_page = start_page
+
+    while end_page < len(page_costs):
+        new_objects = {key: size for key, size in page_costs[end_page].items()
+                       if key is None or key not in split_objects}
+        page_size = sum(new_objects.values())
+        if end_page > start_page and split_size + page_size > max_bytes:
+            break
+        split_objects.update(new_objects)
+        split_size += page_size
+        end_page += 1
+    return end_page
+
+@METRICS.timer("planning")
+def plan_splits(page_costs, max_bytes, start_page=0):
+    """Plan split page ranges as a list of (start_page, end_page) tuples."""
+    ranges = []
+    while start_page < len(page_costs):
+        end_page = plan_split_end(page_costs, start_page, max_bytes)
+        ranges.append((start_page, end_page))
+        start_page = end_page
+    return ranges
+
+def write_split_range(reader, start_page, end_page, max_size_mb, output_path_for, optimize=False, sink=None):
+    """Write pages [start_page, end_page) as one or more splits, each not exceeding max_size_mb.
+
+    The planned range is written once; only if the cost model underestimated is it
+    shrunk with in-memory size probes and the remainder written as further splits.
+    ``output_path_for(index, start_page, end_page)`` names the index-th split of the
+    range. With optimize, each split is shrunk by optimize_split_writer before it is
+    written. With a sink, splits are serialized in memory and ``sink(output_path, data)``
+    writes them, e.g. ``SplitFinisher.write``. Returns a list of
+    (start_page, end_page, output_path, size_bytes) tuples.
+    """
+    pieces = []
+    
+    def produce(piece_start, piece_end):
+        """Write a split to its final location, or serialize it for the sink; returns (path, data, size)."""
+        writer = build_split_writer(reader, piece_start, piece_end, optimize)
+        if sink is None:
+            output_path = output_path_for(len(pieces), piece_start, piece_end)
+            return output_path, None, write_split(writer, output_path)
+        data = serialize_split(writer)
+        return None, data, len(data)
+    
+    while start_page < end_page:
+        piece_end = end_page
+        
+        # Produce the planned split in one go; this verifies the cost model's estimate
+        output_path, data, actual_size = produce(start_page, piece_end)
+        actual_size_mb = actual_size / (1024 * 1024)
+        logger.info(f"Pages {start_page+1} to {piece_end} actual size: {actual_size_mb:.2f}MB")
+        
+        # If the cost model underestimated and the split has more than one page, reduce the page count
+        if actual_size_mb > max_size_mb and piece_end - start_page > 1:
+            logger.warning(f"Pages {start_page+1} to {piece_end} exceed {max_size_mb}MB ({actual_size_mb:.2f}MB), reducing page count")
+            
+            # Remove the rejected output
+            if output_path is not None:
+                os.unlink(output_path)
+            
+            # Binary search to find the right number of pages, probing sizes in memory
+            min_pages = 1
+            max_pages = piece_end - start_page - 1
+            
+            while min_pages <= max_pages:
+                mid_pages = (min_pages + max_pages) // 2
+                test_end_page = start_page + mid_pages
+                
+                test_size_mb = measure_pdf_size(build_split_writer(reader, start_page, test_end_page, optimize)) / (1024 * 1024)
+                
+                if test_size_mb <= max_size_mb:
+                    min_pages = mid_pages + 1
+                else:
+                    max_pages = mid_pages - 1
+            
+            # Use the result of the binary search
+            piece_end = start_page + max_pages
+            
+            # If we couldn't reduce enough (e.g., a single page is too large), handle it
+            if piece_end <= start_page:
+                logger.warning(f"Cannot split page {start_page+1} to be under {max_size_mb}MB")
+                piece_end = start_page + 1
+            
+            # Produce the accepted page range
+            output_path, data, actual_size = produce(start_page, piece_end)
+            logger.info(f"Adjusted pages {start_page+1} to {piece_end}, size: {actual_size / (1024 * 1024):.2f}MB")
+        
+        if sink is not None:
+            output_path = output_path_for(len(pieces), start_page, piece_end)
+            sink(output_path, data)
+        pieces.append((start_page, piece_end, output_path, actual_size))
+        start_page = piece_end
+    return pieces
+
+def _write_split_range_job(pdf_path, start_page, end_page, output_folder, max_size_mb, optimize=False):
+    """Worker process entry point: write one planned page range under temporary names.
+
+    The worker opens its own reader on the file handle, so only the objects of the
+    pages it writes are read. The parent numbers and names the splits afterwards.
+    Returns the written splits, the worker's peak RSS in bytes (or None) and a
+    snapshot of the metrics recorded for this range.
+    """
+    METRICS.reset()
+    
+    def part_path(index, piece_start, piece_end):
+        return os.path.join(output_folder, f".part_p{piece_start+1}-p{piece_end}.pdf")
+    
+    with open(pdf_path, 'rb') as pdf_file:
+        reader = PdfReader(pdf_file)
+        pieces = write_split_range(reader, start_page, end_page, max_size_mb, part_path, optimize)
+    # PyPDF2 objects form reference cycles; free this range's pages before the worker takes the next one
+    del reader
+    gc.collect()
+    return pieces, peak_rss_bytes(), METRICS.snapshot()
+
+@METRICS.timer("hash")
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file, read in chunks so memory stays flat."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ProcessingIndex:
+    """Persistent index of processed PDFs keyed by content hash, split size and optimize setting.
+
+    Stored as SQLite in the complete folder. Each record holds the split plan and
+    the output folder and files (relative to the complete folder) with their sizes.
+    Connections are short-lived so several worker processes can share the file.
+    """
+
+    def __init__(self, complete_folder):
+        self.complete_folder = complete_folder
+        self.path = os.path.join(complete_folder, INDEX_FILENAME)
+        os.makedirs(complete_folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS documents (
+                content_hash TEXT NOT NULL,
+                max_size_mb REAL NOT NULL,
+                optimize INTEGER NOT NULL,
+                source_name TEXT NOT NULL,
+                source_size INTEGER NOT NULL,
+                page_count INTEGER NOT NULL,
+                original_path TEXT,
+                output_folder TEXT NOT NULL,
+                plan TEXT NOT NULL,
+                splits TEXT NOT NULL,
+                processed_at TEXT NOT NULL,
+                PRIMARY KEY (content_hash, max_size_mb, optimize))""")
+            conn.execute("CREATE INDEX IF NOT EXISTS documents_source ON documents (source_name, source_size)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _to_record(self, row):
+        record = dict(row)
+        record["optimize"] = bool(record["optimize"])
+        record["plan"] = json.loads(record["plan"])
+        record["splits"] = json.loads(record["splits"])
+        return record
+
+    def lookup(self, content_hash, max_size_mb, optimize=False):
+        """Return the record for already-processed content whose outputs still exist, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM documents WHERE content_hash = ? AND max_size_mb = ? AND optimize = ?",
+                               (content_hash, max_size_mb, int(optimize))).fetchone()
+        if row is None:
+            return None
+        record = self._to_record(row)
+        for split in record["splits"]:
+            split_path = os.path.join(self.complete_folder, record["output_folder"], split["file"])
+            if not os.path.isfile(split_path) or os.path.getsize(split_path) != split["size"]:
+                logger.info(f"Indexed outputs for {record['source_name']} are missing or changed, reprocessing")
+                return None
+        return record
+
+    def has_candidate(self, source_name, source_size):
+        """Cheap pre-check: was a file with this name and size processed before?"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM documents WHERE source_name = ? AND source_size = ? LIMIT 1",
+                               (source_name, source_size)).fetchone()
+        return row is not None
+
+    def forget(self, content_hash, max_size_mb, optimize=False):
+        """Remove the record of a document processed at this split size and optimize setting."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM documents WHERE content_hash = ? AND max_size_mb = ? AND optimize = ?",
+                         (content_hash, max_size_mb, int(optimize)))
+
+    def record(self, content_hash, max_size_mb, source_name, source_size, page_count,
+               output_folder, plan, splits, optimize=False, original_path=None):
+        """Store (or replace) the result of processing a document."""
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (content_hash, max_size_mb, int(optimize), source_name, source_size, page_count,
+                          original_path, os.path.relpath(output_folder, self.complete_folder),
+                          json.dumps(plan), json.dumps(splits), datetime.now().isoformat()))
+
+    def record_original_path(self, content_hash, max_size_mb, original_path, optimize=False):
+        """Update where the original PDF of a processed document was moved to."""
+        with self._connect() as conn:
+            conn.execute("UPDATE documents SET original_path = ? "
+                         "WHERE content_hash = ? AND max_size_mb = ? AND optimize = ?",
+                         (original_path, content_hash, max_size_mb, int(optimize)))
+
+def move_to_original_folder(pdf_path, original_folder):
+    """Move a processed PDF to the original folder and return where it went.
+
+    The destination name is claimed with an exclusive create before the PDF is moved
+    over it, so two PDFs of the same name moved at once never overwrite each other: a
+    taken name gets a timestamp, then a numeric suffix. With no original folder (batch
+    runs) the PDF is left where it is.
+    """
+    if original_folder is None:
+        return pdf_path
+    os.makedirs(original_folder, exist_ok=True)
+    filename, ext = os.path.splitext(os.path.basename(pdf_path))
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    names = _suffixed_names(f"{filename}_{timestamp}")
+    dest_path = os.path.join(original_folder, os.path.basename(pdf_path))
+    while True:
+        try:
+            with open(dest_path, 'xb'):
+                break
+        except FileExistsError:
+            dest_path = os.path.join(original_folder, f"{next(names)}{ext}")
+    
+    try:
+        os.replace(pdf_path, dest_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            os.unlink(dest_path)
+            raise
+        # The original folder is on another filesystem; copy into the claimed name instead
+        shutil.copy2(pdf_path, dest_path)
+        os.unlink(pdf_path)
+    logger.info(f"Moved original PDF to: {dest_path}")
+    return dest_path
+
+def handle_duplicate(pdf_path, record, complete_folder, original_folder, on_duplicate="skip"):
+    """Answer a repeat drop from the index: skip it, or link/copy the existing splits into a new folder.
+
+    Returns the job's outputs like split_pdf_by_size: the existing folder, or the new one.
+    """
+    existing_folder = os.path.join(complete_folder, record["output_folder"])
+    logger.info(f"{pdf_path} was already processed into {existing_folder}")
+    output_folder = existing_folder
+    
+    if on_duplicate in ("link", "copy"):
+        # Reuse the existing folder's keywords with a fresh timestamp
+        base_name = FOLDER_NAME_SUFFIX_PATTERN.sub("", record["output_folder"])
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Stage the new folder like any other output, so it appears complete or not at all
+        committer = OutputCommitter.reserve(complete_folder, f"{base_name}_{timestamp}")
+        try:
+            for split in record["splits"]:
+                committer.add_existing(os.path.join(existing_folder, split["file"]),
+                                       os.path.join(committer.folder, split["file"]), split["size"],
+                                       link=on_duplicate == "link")
+            output_folder = committer.publish()
+        except Exception:
+            shutil.rmtree(committer.staging_folder, ignore_errors=True)
+            raise
+        logger.info(f"{'Linked' if on_duplicate == 'link' else 'Copied'} {len(record['splits'])} existing split(s) into {output_folder}")
+    
+    move_to_original_folder(pdf_path, original_folder)
+    return {"output_folder": output_folder, "splits": record["splits"]}
+
+def find_processed_duplicate(pdf_path, index, max_size_mb, optimize=False):
+    """Return the index record if pdf_path's content was already processed, hashing only likely matches."""
+    if not index.has_candidate(os.path.basename(pdf_path), os.path.getsize(pdf_path)):
+        return None
+    return index.lookup(hash_file(pdf_path), max_size_mb, optimize)
+
+def write_text_atomic(path, text):
+    """Write a text file so readers see either the old or the new file, never a partial one."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def write_json_atomic(path, data):
+    """Write JSON so readers see either the old or the new file, never a partial one."""
+    write_text_atomic(path, json.dumps(data, indent=1))
+
+class JobJournal:
+    """Crash-safe checkpoint of a split job, written next to its output folder.
+
+    Records the output folder, the split plan and the splits written for each
+    planned range, so a restarted job resumes at the first unfinished range
+    instead of re-planning and re-writing everything. Every update is atomic.
+    """
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+
+    @staticmethod
+    def path_for(complete_folder, content_hash, max_size_mb, optimize=False):
+        """Return the journal path of a job, named after what it produces so jobs never share one."""
+        variant = "-optimize" if optimize else ""
+        return os.path.join(complete_folder, f".{content_hash}-{max_size_mb:g}{variant}{JOURNAL_SUFFIX}")
+
+    @classmethod
+    def find(cls, complete_folder, content_hash, max_size_mb, optimize=False):
+        """Return the journal of an unfinished job for this content, size and optimize setting, or None."""
+        path = cls.path_for(complete_folder, content_hash, max_size_mb, optimize)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable journal {path}: {e}")
+            return None
+        if (data.get("content_hash") != content_hash or data.get("max_size_mb") != max_size_mb
+                or data.get("optimize", False) != optimize):
+            return None
+        return cls(path, data)
+
+    @classmethod
+    def create(cls, complete_folder, folder_name, content_hash, max_size_mb, source_name, page_count, plan,
+               optimize=False):
+        path = cls.path_for(complete_folder, content_hash, max_size_mb, optimize)
+        journal = cls(path, {
+            "content_hash": content_hash,
+            "max_size_mb": max_size_mb,
+            "optimize": optimize,
+            "source_name": source_name,
+            "page_count": page_count,
+            "output_folder": folder_name,
+            "plan": [list(page_range) for page_range in plan],
+            "completed": {},
+        })
+        journal.save()
+        return journal
+
+    @property
+    def folder_name(self):
+        return self.data["output_folder"]
+
+    @folder_name.setter
+    def folder_name(self, folder_name):
+        self.data["output_folder"] = folder_name
+        self.save()
+
+    @property
+    def plan(self):
+        return [tuple(page_range) for page_range in self.data["plan"]]
+
+    def completed_pieces(self, range_index, output_folder):
+        """Return the (start_page, end_page, path, size) splits written for a range, or None if unfinished."""
+        entries = self.data["completed"].get(str(range_index))
+        if entries is None:
+            return None
+        pieces = []
+        for entry in entries:
+            path = os.path.join(output_folder, entry["file"])
+            if not os.path.isfile(path) or os.path.getsize(path) != entry["size"]:
+                return None
+            pieces.append((entry["start_page"], entry["end_page"], path, entry["size"]))
+        return pieces
+
+    def mark_completed(self, range_index, pieces):
+        self.data["completed"][str(range_index)] = [
+            {"file": os.path.basename(path), "start_page": start_page, "end_page": end_page, "size": size}
+            for start_page, end_page, path, size in pieces]
+        self.save()
+
+    def splits(self):
+        """Return every recorded split in page order."""
+        return [entry for range_index in range(len(self.data["plan"]))
+                for entry in self.data["completed"].get(str(range_index), [])]
+
+    def remove_stray_files(self, output_folder):
+        """Delete outputs a crashed run left behind that the journal does not vouch for."""
+        known = {entry["file"] for entries in self.data["completed"].values() for entry in entries}
+        # The manifest is written atomically, and a published folder's manifest identifies its job
+        known.update((OWNER_FILENAME, MANIFEST_FILENAME))
+        for entry in os.scandir(output_folder):
+            if entry.is_file() and entry.name not in known:
+                logger.info(f"Removing incomplete output from a previous run: {entry.path}")
+                os.unlink(entry.path)
+
+    def save(self):
+        write_json_atomic(self.path, self.data)
+
+    def remove(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+def summarize_page_text(text, stop_words, engine=DEFAULT_KEYWORD_ENGINE):
+    """Return what a manifest keeps of a page's text: its length and its most frequent keywords."""
+    counts = _keyword_counts(text, stop_words, engine)
+    # Keep the top keywords in order of first appearance, so ties rank as they would over the full text
+    top = {word for word, count in counts.most_common(MANIFEST_PAGE_KEYWORDS)}
+    return {"chars": len(text), "keywords": [[word, count] for word, count in counts.items() if word in top]}
+
+def encode_page_costs(costs):
+    """Make a page cost mapping JSON-serializable; the page dictionary's None key becomes "page"."""
+    encoded = {}
+    for key, size in costs.items():
+        if key is None:
+            key = "page"
+        elif isinstance(key, bytes):
+            key = key.hex()
+        else:
+            key = f"{key[0]} {key[1]}"
+        encoded[key] = size
+    return encoded
+
+def decode_page_costs(encoded):
+    """Turn a page cost mapping read from a manifest back into one the planner accepts."""
+    return {(None if key == "page" else key): size for key, size in encoded.items()}
+
+def write_manifest(output_folder, manifest):
+    write_json_atomic(os.path.join(output_folder, MANIFEST_FILENAME), manifest)
+
+def split_pdf_by_size(pdf_path, complete_folder, original_folder, stop_words, max_size_mb=24,
+                      split_workers=1, use_index=True, on_duplicate="skip", max_rss_mb=None,
+                      keyword_engine=DEFAULT_KEYWORD_ENGINE, optimize=False, on_split=None,
+                      text_workers=DEFAULT_TEXT_WORKERS):
+    """Split a PDF into parts, each not exceeding max_size_mb.
+
+    With split_workers > 1 all page ranges are planned first and the splits are
+    written across a process pool; numbering and folder layout are unchanged.
+    Otherwise each split is serialized while a SplitFinisher thread writes the ones
+    before it, fsyncing and checkpointing them in batches.
+    Splits are written into a staging folder by an OutputCommitter and the whole
+    folder is published under its final name once the document is done.
+    Returns the published output folder and its splits, or False on failure.
+    With use_index, content that was already split at this size is answered from
+    the processing index according to on_duplicate instead of being redone.
+    Progress is checkpointed in a JobJournal, so an interrupted job resumes at its
+    first unfinished split the next time the same content is processed.
+    Setting max_rss_mb enables low-memory mode: the input is memory-mapped, resolved
+    objects are released after every page estimate and every split, and parallel
+    split writers are throttled to stay within the memory budget.
+    With optimize, splits are shrunk by optimize_split_writer and planned with the
+    matching cost model, so each split holds more pages.
+    on_split, if given, is called with the path of every split once it is in place,
+    so it can be uploaded while the rest of the document is still being written; a
+    resumed job only reports the splits it writes itself.
+    Finished documents get a manifest in their output folder with per-page costs,
+    the keywords of the pages read for naming and the plan, used by resplit_document.
+    With text_workers > 1, the naming text of long documents is extracted in parallel.
+    """
+    document = None
+    try:
+        content_hash = hash_file(pdf_path)
+        
+        # Answer repeat drops of the same content from the index without parsing
+        index = None
+        if use_index:
+            index = ProcessingIndex(complete_folder)
+            record = index.lookup(content_hash, max_size_mb, optimize)
+            if record is not None:
+                METRICS.increment("duplicates_found")
+                return handle_duplicate(pdf_path, record, complete_folder, original_folder, on_duplicate)
+        
+        # Parse the PDF once and share it with folder and split naming
+        low_memory = max_rss_mb is not None
+        with METRICS.timer("parse"):
+            document = PdfDocument(pdf_path, low_memory=low_memory, text_workers=text_workers)
+            reader = document.reader
+            total_pages = document.page_count
+        
+        if total_pages == 0:
+            logger.warning(f"PDF has no pages: {pdf_path}")
+            return False
+        
+        # Estimate each page's serialized cost once so splits can be planned without trial writes;
+        # a resumed job keeps its plan, but the estimates still go into the manifest
+        page_costs = estimate_page_costs(reader, low_memory=low_memory, optimize=optimize)
+        
+        journal = JobJournal.find(complete_folder, content_hash, max_size_mb, optimize)
+        committer = None
+        if journal is not None:
+            # Resume an interrupted job with its original folder and plan, if that folder is still its own
+            committer = OutputCommitter.resume(complete_folder, journal.folder_name, content_hash)
+            if committer is None:
+                logger.warning(f"Not resuming from {journal.path}: its output folder is gone or not this job's")
+                journal.remove()
+                journal = None
+            else:
+                plan = journal.plan
+                logger.info(f"Resuming {pdf_path} from {journal.path}")
+        if journal is None:
+            plan_bytes = int(max_size_mb * 1024 * 1024 * PLAN_FILL_RATIO)
+            logger.info(f"Planning splits of up to {plan_bytes / (1024 * 1024):.2f}MB to ensure final size is under {max_size_mb}MB")
+            
+            # Pack as many pages per split as the cost model allows; a single oversized page gets its own split
+            plan = plan_splits(page_costs, plan_bytes)
+            
+            # Extract the naming text of the folder and of every split at once, across the text workers
+            document.prefetch_text([(0, FOLDER_NAME_PAGES, FOLDER_NAME_TEXT_CHARS)]
+                                   + [(start_page, end_page, SPLIT_NAME_TEXT_CHARS) for start_page, end_page in plan])
+            
+            # Reserve a folder for the splits; a name another job already has gets a numeric suffix
+            folder_name = generate_folder_name(pdf_path, stop_words, document=document,
+                                               keyword_engine=keyword_engine)
+            committer = OutputCommitter.reserve(complete_folder, folder_name, owner=content_hash)
+            journal = JobJournal.create(complete_folder, committer.folder_name, content_hash, max_size_mb,
+                                        os.path.basename(pdf_path), total_pages, plan, optimize)
+        
+        output_folder = committer.folder
+        journal.remove_stray_files(output_folder)
+        
+        pending = [i for i in range(len(plan)) if journal.completed_pieces(i, output_folder) is None]
+        logger.info(f"Planned {len(plan)} split(s) for {total_pages} pages, {len(pending)} still to write")
+        
+        # Rank the keywords of every split still to be written in one batch, keyed by page range;
+        # the pages read for naming are also summarized for the manifest
+        pending_ranges = [plan[i] for i in pending]
+        document.prefetch_text([(start_page, end_page, SPLIT_NAME_TEXT_CHARS) for start_page, end_page in pending_ranges])
+        texts = []
+        page_summaries = {}
+        for start_page, end_page in pending_ranges:
+            pages = document.text_range_pages(start_page, end_page)
+            texts.append("".join(document.page_text(i) for i in pages))
+            for i in pages:
+                page_summaries[i] = summarize_page_text(document.page_text(i), stop_words, keyword_engine)
+        plan_keywords = dict(zip(pending_ranges, extract_keywords_batch(texts, stop_words, num_keywords=2,
+                                                                       engine=keyword_engine)))
+        # All naming text has been read; free the text workers before the splits are written
+        document.stop_text_workers()
+        if low_memory:
+            document.release_objects()
+        
+        def name_pieces(pieces, first_split_num):
+            """Give splits written under temporary .part names their numbered final names."""
+            named = []
+            for split_num, (start_page, end_page, path, size) in enumerate(pieces, start=first_split_num):
+                if os.path.basename(path).startswith(".part_"):
+                    split_name = generate_split_name(pdf_path, start_page, end_page, split_num, stop_words,
+                                                     document=document, keyword_engine=keyword_engine,
+                                                     keywords=plan_keywords.get((start_page, end_page)))
+                    output_path = os.path.join(output_folder, f"{split_name}.pdf")
+                    os.replace(path, output_path)
+                    path = output_path
+                    logger.info(f"Created split {split_num}: {path} ({size / (1024 * 1024):.2f}MB)")
+                named.append((start_page, end_page, path, size))
+            return named
+        
+        # Ranges written by this run; those finished before an interruption were already handed to on_split
+        written = set()
+        
+        if split_workers > 1 and len(pending) > 1:
+            # Write every unfinished range in parallel, checkpointing each as it completes
+            logger.info(f"Writing splits with {split_workers} worker processes")
+            budget = max_rss_mb * 1024 * 1024 if low_memory else None
+            split_working_set = max_size_mb * 1024 * 1024 * SPLIT_WORKING_SET_FACTOR
+            errors = []
+            with ProcessPoolExecutor(max_workers=min(split_workers, len(pending)),
+                                     mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker) as executor:
+                running = {}
+                while pending or running:
+                    # Near the memory budget, run fewer split writers at a time (but always at least one)
+                    limit = split_workers
+                    if budget is not None:
+                        available = budget - (current_rss_bytes() or 0)
+                        limit = max(1, min(split_workers, int(available // split_working_set)))
+                        if limit < split_workers and pending:
+                            logger.debug(f"Memory budget allows {limit} concurrent split writer(s)")
+                    while pending and len(running) < limit:
+                        i = pending.pop(0)
+                        running[executor.submit(_write_split_range_job, pdf_path, plan[i][0], plan[i][1],
+                                                output_folder, max_size_mb, optimize)] = i
+                    
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        range_index = running.pop(future)
+                        try:
+                            pieces, worker_peak_rss, worker_metrics = future.result()
+                            METRICS.merge(worker_metrics)
+                            journal.mark_completed(range_index, pieces)
+                            written.add(range_index)
+                            if worker_peak_rss:
+                                split_working_set = max(split_working_set, worker_peak_rss)
+                        except Exception as e:
+                            errors.append(e)
+                            pending = []
+            if errors:
+                raise errors[0]
+        
+        def checkpoint(range_index, pieces):
+            """Record a finished range and hand its splits on; runs once they are on disk."""
+            journal.mark_completed(range_index, pieces)
+            if on_split is not None and range_index in written:
+                for _, _, output_path, _ in pieces:
+                    on_split(output_path)
+        
+        # Number and name the splits in page order, writing any range that is still unfinished.
+        # Splits are serialized here while the finisher thread writes and checkpoints the previous ones.
+        split_num = 1
+        with SplitFinisher(committer, depth=1 if low_memory else DEFAULT_PIPELINE_DEPTH) as finisher:
+            for range_index, (start_page, end_page) in enumerate(plan):
+                pieces = journal.completed_pieces(range_index, output_folder)
+                if pieces is None:
+                    logger.info(f"Creating split {split_num} with pages {start_page+1} to {end_page}")
+                    
+                    def output_path_for(index, piece_start, piece_end):
+                        split_name = generate_split_name(pdf_path, piece_start, piece_end, split_num + index,
+                                                         stop_words, document=document, keyword_engine=keyword_engine,
+                                                         keywords=plan_keywords.get((piece_start, piece_end)))
+                        return os.path.join(output_folder, f"{split_name}.pdf")
+                    
+                    pieces = write_split_range(reader, start_page, end_page, max_size_mb, output_path_for, optimize,
+                                               sink=finisher.write)
+                    written.add(range_index)
+                    for offset, (_, _, output_path, size) in enumerate(pieces):
+                        logger.info(f"Created split {split_num + offset}: {output_path} ({size / (1024 * 1024):.2f}MB)")
+                    if low_memory:
+                        document.release_objects()
+                else:
+                    pieces = name_pieces(pieces, split_num)
+                finisher.then(lambda range_index=range_index, pieces=pieces: checkpoint(range_index, pieces))
+                split_num += len(pieces)
+        
+        document.close()
+        METRICS.increment("pages_split", total_pages)
+        METRICS.increment("splits_created", split_num - 1)
+        
+        splits = journal.splits()
+        source_size = os.path.getsize(pdf_path)
+        METRICS.increment("source_bytes_split", source_size)
+        
+        # The manifest is staged with the splits, so it is published with them. It points at the
+        # original where it is now, and is updated once the original has been moved.
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "source": os.path.basename(pdf_path),
+            "source_size": source_size,
+            "original_path": os.path.abspath(pdf_path),
+            "content_hash": content_hash,
+            "page_count": total_pages,
+            "max_size_mb": max_size_mb,
+            "optimize": optimize,
+            "keyword_engine": keyword_engine,
+            "plan": plan,
+            "splits": splits,
+            "pages": [{"cost": encode_page_costs(costs), "text": page_summaries.get(i)}
+                      for i, costs in enumerate(page_costs)],
+        }
+        try:
+            write_manifest(output_folder, manifest)
+        except OSError as e:
+            logger.warning(f"Could not write the manifest for {output_folder}: {e}")
+        
+        output_folder = committer.publish()
+        if committer.folder_name != journal.folder_name:
+            # Published under another name because the reserved one was taken meanwhile
+            journal.folder_name = committer.folder_name
+        if index is not None:
+            index.record(content_hash, max_size_mb, os.path.basename(pdf_path), source_size,
+                         total_pages, output_folder, plan, splits, optimize, manifest["original_path"])
+        journal.remove()
+        
+        # Move the original PDF to the completed folder and record the name it actually got
+        original_path = move_to_original_folder(pdf_path, original_folder)
+        if original_path != pdf_path:
+            manifest["original_path"] = os.path.abspath(original_path)
+            try:
+                write_manifest(output_folder, manifest)
+            except OSError as e:
+                logger.warning(f"Could not update the manifest for {output_folder}: {e}")
+            if index is not None:
+                index.record_original_path(content_hash, max_size_mb, manifest["original_path"], optimize)
+        
+        return {"output_folder": output_folder, "splits": splits}
+    except Exception as e:
+        logger.error(f"Error splitting PDF: {e}", exc_info=True)
+        return False
+    finally:
+        # Stops the text workers if the job failed before the document was closed
+        if document is not None:
+            document.close()
+
+def resplit_document(output_folder, max_size_mb, stop_words, source_path=None, use_index=True):
+    """Re-split a processed document for a new maximum size, using the manifest in its output folder.
+
+    A new plan is computed from the manifest's page costs. Splits whose page range
+    is unchanged (and that fit the new size) are kept, renumbered if needed; only the
+    other ranges are read from the original PDF (source_path, or the path in the
+    manifest) and written. The new folder is staged by an OutputCommitter, with the
+    kept splits hard-linked into it, and swapped in for the old one once complete, so
+    an interrupted resplit leaves the old folder as it was. Returns True on success.
+    """
+    document = None
+    committer = None
+    try:
+        OutputCommitter.recover_replaced(output_folder)
+        manifest_path = os.path.join(output_folder, MANIFEST_FILENAME)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version in {manifest_path}")
+        old_max_size_mb = manifest["max_size_mb"]
+        keyword_engine = manifest["keyword_engine"]
+        pages = manifest["pages"]
+        
+        page_costs = [decode_page_costs(page["cost"]) for page in pages]
+        plan = plan_splits(page_costs, int(max_size_mb * 1024 * 1024 * PLAN_FILL_RATIO))
+        existing = {(entry["start_page"], entry["end_page"]): entry for entry in manifest["splits"]}
+        reused = {page_range: existing[page_range] for page_range in plan
+                  if page_range in existing and existing[page_range]["size"] <= max_size_mb * 1024 * 1024}
+        logger.info(f"Resplitting {output_folder} at {max_size_mb}MB: {len(plan)} split(s), "
+                    f"{len(reused)} unchanged")
+        
+        def open_document():
+            """Open the original PDF on first use, checking it is the content the manifest describes."""
+            nonlocal document
+            if document is None:
+                path = source_path or manifest["original_path"]
+                if hash_file(path) != manifest["content_hash"]:
+                    raise ValueError(f"{path} is not the PDF described by {manifest_path}")
+                document = PdfDocument(path)
+            return document
+        
+        def range_keywords(start_page, end_page):
+            """Rank a range's name keywords from the page summaries, over the pages text_range would read."""
+            counts = Counter()
+            chars = 0
+            for i in range(start_page, end_page):
+                if pages[i]["text"] is None:
+                    pages[i]["text"] = summarize_page_text(open_document().page_text(i), stop_words, keyword_engine)
+                counts.update(dict(pages[i]["text"]["keywords"]))
+                chars += pages[i]["text"]["chars"]
+                if chars > SPLIT_NAME_TEXT_CHARS:
+                    break
+            return [word for word, count in counts.most_common(2)]
+        
+        # Build the new folder in the staging folder; the old one is untouched until it is swapped out
+        committer = OutputCommitter.replacing(output_folder)
+        
+        def part_path(index, piece_start, piece_end):
+            return os.path.join(committer.folder, f".part_p{piece_start+1}-p{piece_end}.pdf")
+        
+        # Write the changed ranges under temporary names first, as their numbers depend on the splits before them
+        pieces = []
+        for start_page, end_page in plan:
+            entry = reused.get((start_page, end_page))
+            if entry is not None:
+                pieces.append((start_page, end_page, os.path.join(output_folder, entry["file"]), entry["size"], entry))
+                continue
+            for piece in write_split_range(open_document().reader, start_page, end_page, max_size_mb, part_path,
+                                           manifest["optimize"]):
+                pieces.append(piece + (None,))
+        
+        # Give every split its final numbered name, linking the reused ones in from the old folder
+        splits = []
+        for split_num, (start_page, end_page, path, size, entry) in enumerate(pieces, start=1):
+            if entry is not None:
+                # Keep the name of a reused split and only update its number
+                file_name = f"{split_num:02d}_{entry['file'].split('_', 1)[1]}"
+                committer.add_existing(path, os.path.join(committer.folder, file_name), size)
+            else:
+                split_name = generate_split_name(manifest["source"], start_page, end_page, split_num, stop_words,
+                                                 keywords=range_keywords(start_page, end_page))
+                file_name = f"{split_name}.pdf"
+                os.replace(path, os.path.join(committer.folder, file_name))
+                committer.track(os.path.join(committer.folder, file_name), size)
+            splits.append({"file": file_name, "start_page": start_page, "end_page": end_page, "size": size})
+            logger.info(f"Split {len(splits)}: {file_name} ({size / (1024 * 1024):.2f}MB)")
+        
+        # Anything else in the folder that is not an old split is carried over
+        known = {entry["file"] for entry in manifest["splits"]} | {MANIFEST_FILENAME}
+        for entry in os.scandir(output_folder):
+            if entry.is_file() and entry.name not in known:
+                committer.add_existing(entry.path, os.path.join(committer.folder, entry.name),
+                                       entry.stat().st_size)
+        
+        manifest.update(max_size_mb=max_size_mb, plan=plan, splits=splits)
+        write_manifest(committer.folder, manifest)
+        output_folder = committer.replace()
+        METRICS.increment("splits_reused", len(reused))
+        METRICS.increment("splits_created", len(splits) - len(reused))
+        
+        if use_index:
+            index = ProcessingIndex(os.path.dirname(os.path.abspath(output_folder)))
+            if old_max_size_mb != max_size_mb:
+                index.forget(manifest["content_hash"], old_max_size_mb, manifest["optimize"])
+            index.record(manifest["content_hash"], max_size_mb, manifest["source"], manifest["source_size"],
+                         manifest["page_count"], output_folder, plan, splits, manifest["optimize"],
+                         manifest["original_path"])
+        return True
+    except Exception as e:
+        logger.error(f"Error resplitting {output_folder}: {e}", exc_info=True)
+        if committer is not None and not committer.published:
+            shutil.rmtree(committer.staging_folder, ignore_errors=True)
+        return False
+    finally:
+        if document is not None:
+            document.close()
+
+def count_tokens(text):
+    """Return an approximate token count of text: its words plus its punctuation marks."""
+    return len(CHUNK_TOKEN_PATTERN.findall(text))
+
+def _within_budget(chars, tokens, max_chars=None, max_tokens=None):
+    return (max_chars is None or chars <= max_chars) and (max_tokens is None or tokens <= max_tokens)
+
+def _cut_word(word, max_chars=None, max_tokens=None):
+    """Cut a whitespace-free run over budget at token boundaries, and a token longer than max_chars where it must be."""
+    piece, tokens = "", 0
+    for token in CHUNK_TOKEN_PATTERN.findall(word):
+        if piece and not _within_budget(len(piece) + len(token), tokens + 1, max_chars, max_tokens):
+            yield piece
+            piece, tokens = "", 0
+        while max_chars is not None and len(token) > max_chars:
+            yield token[:max_chars]
+            token = token[max_chars:]
+        piece += token
+        tokens += 1
+    if piece:
+        yield piece
+
+def _cut_text(text, max_chars=None, max_tokens=None):
+    """Cut text at whitespace into pieces within the character and token budgets."""
+    words, chars, tokens = [], 0, 0
+    for word in text.split():
+        word_tokens = count_tokens(word)
+        if words and not _within_budget(chars + 1 + len(word), tokens + word_tokens, max_chars, max_tokens):
+            yield " ".join(words)
+            words, chars, tokens = [], 0, 0
+        # A word over budget on its own (e.g. "a,b,c,d,e") is cut inside, keeping its last piece
+        if not _within_budget(len(word), word_tokens, max_chars, max_tokens):
+            *pieces, word = _cut_word(word, max_chars, max_tokens)
+            yield from pieces
+            word_tokens = count_tokens(word)
+        chars += len(word) + (1 if words else 0)
+        tokens += word_tokens
+        words.append(word)
+    if words:
+        yield " ".join(words)
+
+def chunk_page_texts(page_texts, max_chars=None, max_tokens=None):
+    """Group (page_num, text) pairs into chunks within the character and token budgets.
+
+    Yields (start_page, end_page, text) with end_page exclusive. Whole pages are packed
+    together while they fit; a page over budget on its own is cut at whitespace, or
+    inside a long run without whitespace, into several chunks that share its page
+    range. Blank pages are skipped.
+    """
+    parts, chars, tokens = [], 0, 0
+    start_page = end_page = 0
+    for page_num, text in page_texts:
+        if not text.strip():
+            continue
+        page_chars, page_tokens = len(text), count_tokens(text)
+        separator = 1 if parts else 0
+        if parts and not _within_budget(chars + separator + page_chars, tokens + page_tokens, max_chars, max_tokens):
+            yield start_page, end_page, "\n".join(parts)
+            parts, chars, tokens, separator = [], 0, 0, 0
+        
+        if not _within_budget(page_chars, page_tokens, max_chars, max_tokens):
+            for piece in _cut_text(text, max_chars, max_tokens):
+                yield page_num, page_num + 1, piece
+            continue
+        
+        if not parts:
+            start_page = page_num
+        parts.append(text)
+        chars += separator + page_chars
+        tokens += page_tokens
+        end_page = page_num + 1
+    if parts:
+        yield start_page, end_page, "\n".join(parts)
+
+def split_pdf_to_jsonl(pdf_path, complete_folder, original_folder, stop_words, max_chars=DEFAULT_CHUNK_CHARS,
+                       max_tokens=None, keyword_engine=DEFAULT_KEYWORD_ENGINE, max_rss_mb=None, on_split=None):
+    """Write the text of a PDF as JSONL chunks instead of splitting it into smaller PDFs.
+
+    Page text comes from the same extraction used for naming and chunks are streamed
+    to disk as they fill, so no PdfWriter is built. Each record carries its page range,
+    keywords and the name a PDF split of those pages would get. on_split, if given,
+    is called with the path of the finished JSONL file.
+    Returns the published output folder and the JSONL file, or False on failure.
+    """
+    document = None
+    committer = None
+    try:
+        low_memory = max_rss_mb is not None
+        with METRICS.timer("parse"):
+            document = PdfDocument(pdf_path, low_memory=low_memory)
+            total_pages = document.page_count
+        
+        if total_pages == 0:
+            logger.warning(f"PDF has no pages: {pdf_path}")
+            return False
+        
+        committer = OutputCommitter.reserve(complete_folder, generate_folder_name(
+            pdf_path, stop_words, document=document, keyword_engine=keyword_engine))
+        folder_name = committer.folder_name
+        file_name = f"{folder_name}.jsonl"
+        output_path = os.path.join(committer.folder, file_name)
+        source_name = os.path.basename(pdf_path)
+        
+        # Written in the staging folder, so a truncated file is never seen in the complete folder
+        chunk_count = 0
+        page_texts = ((page_num, document.page_text(page_num)) for page_num in range(total_pages))
+        with open(output_path, 'w', encoding='utf-8') as output_file:
+            for start_page, end_page, text in chunk_page_texts(page_texts, max_chars, max_tokens):
+                chunk_count += 1
+                keywords = extract_keywords_from_text(text, stop_words, num_keywords=2, engine=keyword_engine)
+                record = {
+                    "id": f"{folder_name}_{chunk_count:04d}",
+                    "source": source_name,
+                    "chunk": chunk_count,
+                    "start_page": start_page + 1,
+                    "end_page": end_page,
+                    "name": generate_split_name(pdf_path, start_page, end_page, chunk_count, stop_words,
+                                                keywords=keywords),
+                    "keywords": keywords,
+                    "chars": len(text),
+                    "tokens": count_tokens(text),
+                    "text": text,
+                }
+                output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if low_memory:
+                    document.release_objects()
+            output_size = output_file.tell()
+            committer.track(output_path, output_size)
+        output_folder = committer.publish()
+        output_path = os.path.join(output_folder, file_name)
+        if on_split is not None:
+            on_split(output_path)
+        
+        METRICS.increment("pages_split", total_pages)
+        METRICS.increment("source_bytes_split", os.path.getsize(pdf_path))
+        METRICS.increment("chunks_written", chunk_count)
+        logger.info(f"Wrote {chunk_count} text chunk(s) for {total_pages} pages to {output_path}")
+        
+        # Move the original PDF to the completed folder
+        move_to_original_folder(pdf_path, original_folder)
+        
+        return {"output_folder": output_folder,
+                "splits": [{"file": file_name, "start_page": 0, "end_page": total_pages, "size": output_size,
+                            "chunks": chunk_count}]}
+    except Exception as e:
+        logger.error(f"Error writing text chunks: {e}", exc_info=True)
+        # Nothing resumes a JSONL job, so its unpublished staging folder is only clutter
+        if committer is not None and not committer.published:
+            shutil.rmtree(committer.staging_folder, ignore_errors=True)
+        return False
+    finally:
+        if document is not None:
+            document.close()
+
+def write_metrics_file(metrics_dir):
+    """Write the current metrics in Prometheus text format, e.g. for node_exporter's textfile collector."""
+    os.makedirs(metrics_dir, exist_ok=True)
+    write_text_atomic(os.path.join(metrics_dir, METRICS_FILENAME), METRICS.to_prometheus())
+
+def write_job_summary(metrics_dir, summary):
+    """Write the JSON metrics summary of one job and return its path."""
+    jobs_folder = os.path.join(metrics_dir, JOB_SUMMARY_FOLDER)
+    os.makedirs(jobs_folder, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    base_name = os.path.splitext(os.path.basename(summary["source"]))[0]
+    summary_path = os.path.join(jobs_folder, f"{timestamp}_{base_name}.json")
+    write_json_atomic(summary_path, summary)
+    return summary_path
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves the daemon's metrics at /metrics (Prometheus text format) and /metrics.json."""
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = METRICS.to_prometheus().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body = json.dumps(METRICS.snapshot()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Metrics request: {format % args}")
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve metrics over HTTP from a background thread and return the server."""
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="pdf-metrics", daemon=True).start()
+    logger.info(f"Serving metrics at http://{host}:{server.server_port}/metrics")
+    return server
+
+class SplitUploader:
+    """Uploads finished outputs to an HTTP endpoint while later splits are still being written.
+
+    Each of ``concurrency`` threads keeps one persistent connection, so at most that
+    many uploads run at once and connections are reused from file to file. A file is
+    PUT to ``<upload_url>/<path relative to root_folder>``; files larger than
+    chunk_bytes are sent as a series of PUTs with a Content-Range header, so a failed
+    request only resends its own chunk. Connection errors, 429 and 5xx responses are
+    retried with exponential backoff until ``stop`` is called.
+    """
+
+    def __init__(self, upload_url, root_folder, concurrency=DEFAULT_UPLOAD_CONCURRENCY,
+                 retries=DEFAULT_UPLOAD_RETRIES, chunk_bytes=UPLOAD_CHUNK_BYTES,
+                 timeout=UPLOAD_TIMEOUT_SECONDS):
+        url = urlsplit(upload_url)
+        if url.scheme not in ("http", "https") or not url.netloc:
+            raise ValueError(f"Upload URL must be an http:// or https:// URL: {upload_url}")
+        self.scheme = url.scheme
+        self.netloc = url.netloc
+        self.base_path = url.path.rstrip("/")
+        self.root_folder = root_folder
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.chunk_bytes = chunk_bytes
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f"pdf-upload-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Uploading outputs to {self.scheme}://{self.netloc}{self.base_path}/ "
+                    f"with {self.concurrency} connection(s)")
+
+    def submit(self, path):
+        """Queue a finished file for upload."""
+        self._queue.put(path)
+
+    def stop(self):
+        """Try each queued upload once more without retrying, then stop the upload threads."""
+        self._stopping.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return connection_class(self.netloc, timeout=self.timeout)
+
+    def _run(self):
+        connection = self._connect()
+        while True:
+            path = self._queue.get()
+            if path is None:
+                break
+            try:
+                with METRICS.timer("upload"):
+                    connection = self._upload(connection, path)
+                METRICS.increment("uploads_succeeded")
+            except Exception as e:
+                logger.error(f"Failed to upload {path}: {e}")
+                METRICS.increment("uploads_failed")
+        connection.close()
+
+    def _upload(self, connection, path):
+        """Upload one file, in chunks if it is large. Returns the connection to keep using."""
+        # A split reported from its staging folder is uploaded under its published name,
+        # and read from there if its folder has been published since
+        published = published_path(path)
+        relative_path = os.path.relpath(published, self.root_folder).replace(os.sep, "/")
+        target = f"{self.base_path}/{quote(relative_path)}"
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            f = open(published, 'rb')
+        with f:
+            total = os.fstat(f.fileno()).st_size
+            if total <= self.chunk_bytes:
+                connection = self._put(connection, target, f.read(), {})
+            else:
+                for offset in range(0, total, self.chunk_bytes):
+                    chunk = f.read(self.chunk_bytes)
+                    content_range = f"bytes {offset}-{offset + len(chunk) - 1}/{total}"
+                    connection = self._put(connection, target, chunk, {"Content-Range": content_range})
+        METRICS.increment("upload_bytes", total)
+        logger.info(f"Uploaded {relative_path} ({total / (1024 * 1024):.2f}MB)")
+        return connection
+
+    def _put(self, connection, target, body, headers):
+        """PUT one request body, retrying with backoff. Returns the connection to keep using."""
+        headers = {"Content-Type": "application/octet-stream", **headers}
+        for attempt in range(self.retries + 1):
+            try:
+                connection.request("PUT", target, body=body, headers=headers)
+                response = connection.getresponse()
+                # Read the whole response so the connection can be reused
+                response.read()
+                if response.status < 300:
+                    return connection
+                error = f"HTTP {response.status} {response.reason}"
+                if response.status != 429 and response.status < 500:
+                    raise RuntimeError(error)
+            except (OSError, http.client.HTTPException) as e:
+                error = str(e) or type(e).__name__
+                # The connection is in an unknown state after a failure; start a new one
+                connection.close()
+                connection = self._connect()
+            if attempt == self.retries or self._stopping.is_set():
+                raise RuntimeError(f"{error} after {attempt + 1} attempt(s)")
+            delay = min(UPLOAD_BACKOFF_SECONDS * 2 ** attempt, UPLOAD_MAX_BACKOFF_SECONDS)
+            logger.warning(f"Upload of {target} failed ({error}), retrying in {delay:.1f}s")
+            METRICS.increment("upload_retries")
+            self._stopping.wait(delay)
+
+# Queue through which worker processes report finished outputs to the parent's uploader
+_finished_outputs = None
+
+def _init_worker(finished_outputs=None):
+    """Let the main process handle Ctrl+C; workers finish or are shut down by it."""
+    global _finished_outputs
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _finished_outputs = finished_outputs
+
+def _report_finished_output(path):
+    _finished_outputs.put(path)
+
+def estimate_job_cost(pdf_path):
+    """Return a PDF's size in bytes and page count, reading only its xref and page tree root.
+
+    The count comes from the root page tree node's /Count, so no page is loaded.
+    The page count is None if it cannot be read (the cost is then the file size
+    alone); the job itself reports any error.
+    """
+    size = os.path.getsize(pdf_path)
+    try:
+        with open(pdf_path, 'rb') as pdf_file:
+            page_count = int(PdfReader(pdf_file, strict=False).trailer["/Root"]["/Pages"]["/Count"])
+    except Exception as e:
+        logger.debug(f"Could not count pages of {pdf_path}: {e}")
+        page_count = None
+    return size, page_count
+
+def _run_split_job(pdf_path, complete_folder, original_folder, stop_words, split_options, output_mode="pdf"):
+    """Worker process entry point: split one PDF, or write its text as JSONL chunks.
+
+    Returns whether the job succeeded, a summary of the metrics it recorded and the
+    job's outputs (its output folder and splits), which are None if it failed.
+    """
+    # Each worker runs one job at a time, so its registry holds exactly this job's metrics
+    METRICS.reset()
+    
+    # Check if the file is still there (it might have been moved by another process)
+    if not os.path.exists(pdf_path):
+        logger.warning(f"File no longer exists: {pdf_path}")
+        return False, {}, None
+    split_job = split_pdf_to_jsonl if output_mode == "jsonl" else split_pdf_by_size
+    if _finished_outputs is not None:
+        split_options = dict(split_options, on_split=_report_finished_output)
+    with METRICS.timer("split_job"):
+        outputs = split_job(pdf_path, complete_folder, original_folder, stop_words, **split_options)
+    summary = METRICS.snapshot()
+    summary["worker_peak_rss_bytes"] = peak_rss_bytes()
+    return bool(outputs), summary, outputs or None
+
+class PDFWorkQueue:
+    """A bounded, cost-ordered queue of PDFs to split, consumed by a pool of worker processes.
+
+    ``submit`` blocks while the queue is full so producers feel backpressure. A
+    dispatcher thread hands at most ``workers`` jobs to the process pool at a time,
+    cheapest first: a job's cost is its file size plus SCHEDULER_PAGE_COST_BYTES per
+    page, lowered by its priority and by the time it has waited so large files still
+    get their turn. With memory_budget_mb, a job only starts while the estimated
+    memory of the running jobs leaves room for it (or when nothing else runs), so
+    several huge files never run at once.
+    Queue wait and job latency are recorded in METRICS together with the metrics
+    each worker reports; with metrics_dir they are also written out after every job.
+    With an uploader, workers report each output as it lands and it is uploaded
+    from this process while the job goes on.
+    on_started and on_finished, if given, are called with the PDF's path when its
+    job starts, and with the path, whether it succeeded and its outputs (as returned
+    by ``_run_split_job``) when it ends.
+    Extra keyword arguments are passed through to ``split_pdf_by_size``, or to
+    ``split_pdf_to_jsonl`` when output_mode is "jsonl".
+    """
+
+    def __init__(self, complete_folder, original_folder, stop_words,
+                 workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, metrics_dir=None,
+                 output_mode="pdf", uploader=None, memory_budget_mb=None, on_started=None,
+                 on_finished=None, **split_options):
+        self.complete_folder = complete_folder
+        self.original_folder = original_folder
+        self.stop_words = stop_words
+        self.split_options = split_options
+        self.output_mode = output_mode
+        self.metrics_dir = metrics_dir
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.memory_budget = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+        # Heap of (scheduling key, sequence number, pdf_path), guarded by _cond with the counters below
+        self._heap = []
+        self._sequence = 0
+        self._running = 0
+        self._running_memory = 0
+        self._stopping = False
+        self._cond = threading.Condition()
+        # pdf_path -> [submit time, seconds spent waiting in the queue, estimated memory in bytes]
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self.uploader = uploader
+        self.on_started = on_started
+        self.on_finished = on_finished
+        self._finished_outputs = None
+        self._executor = None
+        self._dispatcher = None
+        self._forwarder = None
+
+    def start(self):
+        """Start the worker pool and the dispatcher thread."""
+        # Spawn rather than fork: the observer and dispatcher threads may hold locks at fork time
+        context = multiprocessing.get_context("spawn")
+        if self.uploader is not None:
+            self._finished_outputs = context.Queue()
+            self._forwarder = threading.Thread(target=self._forward_outputs, name="pdf-upload-forwarder",
+                                               daemon=True)
+            self._forwarder.start()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                             initializer=_init_worker, initargs=(self._finished_outputs,))
+        self._dispatcher = threading.Thread(target=self._dispatch, name="pdf-dispatcher", daemon=True)
+        self._dispatcher.start()
+        logger.info(f"Started {self.workers} worker process(es)")
+
+    def submit(self, pdf_path, priority=0):
+        """Queue a PDF for splitting, blocking while the queue is full. Returns False for duplicates.
+
+        Jobs with a higher priority run before cheaper jobs with a lower one.
+        """
+        submitted = time.monotonic()
+        with self._pending_lock:
+            if pdf_path in self._pending:
+                logger.debug(f"PDF already queued: {pdf_path}")
+                return False
+            self._pending[pdf_path] = [submitted, None, 0]
+        try:
+            size, page_count = estimate_job_cost(pdf_path)
+        except OSError as e:
+            logger.warning(f"Could not estimate cost of {pdf_path}: {e}")
+            size, page_count = 0, None
+        cost = size + (page_count or 0) * SCHEDULER_PAGE_COST_BYTES
+        key = (cost - priority * SCHEDULER_PRIORITY_BYTES
+               + SCHEDULER_AGING_BYTES_PER_SECOND * submitted)
+        with self._pending_lock:
+            self._pending[pdf_path][2] = self._job_memory(size)
+        with self._cond:
+            while len(self._heap) >= self.queue_size:
+                self._cond.wait()
+            heapq.heappush(self._heap, (key, self._sequence, pdf_path))
+            self._sequence += 1
+            waiting = len(self._heap)
+            self._cond.notify_all()
+        logger.info(f"Queued PDF: {pdf_path} ({size / (1024 * 1024):.1f}MB, "
+                    f"{page_count if page_count is not None else '?'} pages, {waiting} waiting)")
+        return True
+
+    def _job_memory(self, size):
+        """Return the memory in bytes a job on a file of this size is assumed to need."""
+        max_rss_mb = self.split_options.get("max_rss_mb")
+        if max_rss_mb is not None:
+            return max_rss_mb * 1024 * 1024
+        return JOB_BASE_MEMORY_BYTES + size * JOB_MEMORY_FACTOR
+
+    def _can_start(self, memory):
+        if self._running >= self.workers:
+            return False
+        # A job larger than the whole budget still runs, but only on its own
+        return (self.memory_budget is None or self._running == 0
+                or self._running_memory + memory <= self.memory_budget)
+
+    def _forward_outputs(self):
+        while True:
+            path = self._finished_outputs.get()
+            if path is None:
+                break
+            self.uploader.submit(path)
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                # Wait until the cheapest job fits the worker and memory budgets; later jobs never
+                # overtake it, so a large job that has aged to the front is not starved by small ones
+                while True:
+                    if self._heap:
+                        pdf_path = self._heap[0][2]
+                        with self._pending_lock:
+                            memory = self._pending[pdf_path][2]
+                        if self._can_start(memory):
+                            break
+                    elif self._stopping:
+                        return
+                    self._cond.wait()
+                heapq.heappop(self._heap)
+                self._running += 1
+                self._running_memory += memory
+                self._cond.notify_all()
+            with self._pending_lock:
+                timing = self._pending[pdf_path]
+                timing[1] = time.monotonic() - timing[0]
+            METRICS.observe("queue_wait", timing[1])
+            if self.on_started is not None:
+                self.on_started(pdf_path)
+            try:
+                future = self._executor.submit(_run_split_job, pdf_path, self.complete_folder,
+                                               self.original_folder, self.stop_words,
+                                               self.split_options, self.output_mode)
+            except Exception as e:
+                logger.error(f"Could not start job for {pdf_path}: {e}")
+                self._finish(pdf_path, None)
+                continue
+            future.add_done_callback(lambda f, path=pdf_path: self._finish(path, f))
+
+    def _finish(self, pdf_path, future):
+        with self._pending_lock:
+            submitted, queue_wait, memory = self._pending.pop(pdf_path)
+        with self._cond:
+            self._running -= 1
+            self._running_memory -= memory
+            self._cond.notify_all()
+        latency = time.monotonic() - submitted
+        ok, job_metrics, outputs = False, {}, None
+        if future is not None:
+            try:
+                ok, job_metrics, outputs = future.result()
+                if not ok:
+                    logger.warning(f"Job did not complete: {pdf_path}")
+            except Exception as e:
+                logger.error(f"Worker failed on {pdf_path}: {e}", exc_info=True)
+        
+        METRICS.merge(job_metrics)
+        METRICS.increment("jobs_succeeded" if ok else "jobs_failed")
+        METRICS.observe("job_latency", latency)
+        if self.on_finished is not None:
+            self.on_finished(pdf_path, ok, outputs)
+        if self.metrics_dir is None:
+            return
+        summary = dict(job_metrics, source=pdf_path, ok=ok,
+                       finished_at=datetime.now().isoformat(timespec="seconds"),
+                       queue_wait_seconds=round(queue_wait or 0.0, 6),
+                       latency_seconds=round(latency, 6))
+        try:
+            write_job_summary(self.metrics_dir, summary)
+            write_metrics_file(self.metrics_dir)
+        except OSError as e:
+            logger.warning(f"Could not write metrics: {e}")
+
+    def stop(self, wait=True):
+        """Run the jobs still queued, then stop dispatching and shut down the worker pool."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        if self._forwarder is not None:
+            self._finished_outputs.put(None)
+            self._forwarder.join()
+
+class FileStabilityTracker:
+    """Releases dropped files once they have been quiet for ``settle_seconds``.
+
+    Watchdog events and size/mtime changes reset a file's quiet window, and a
+    close-after-write event releases it at the next check if it stopped changing.
+    A single polling thread serves every in-flight upload.
+    """
+
+    def __init__(self, on_stable, settle_seconds=DEFAULT_SETTLE_SECONDS, poll_interval=0.25):
+        self.on_stable = on_stable
+        self.settle_seconds = settle_seconds
+        self.poll_interval = min(poll_interval, max(settle_seconds, 0.01))
+        # path -> [(size, mtime), time of last change, closed by writer, time first seen]
+        self._files = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="pdf-stability", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def touch(self, path):
+        """Record activity on a file, starting to track it if needed."""
+        with self._lock:
+            state = self._files.get(path)
+            if state is None:
+                now = time.monotonic()
+                self._files[path] = [None, now, False, now]
+            else:
+                state[1] = time.monotonic()
+                state[2] = False
+
+    def mark_closed(self, path):
+        """Record that the writer closed the file, so it can be released without the full quiet window."""
+        with self._lock:
+            state = self._files.get(path)
+            if state is not None:
+                state[2] = True
+
+    def forget(self, path):
+        with self._lock:
+            self._files.pop(path, None)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._files)
+
+    def _run(self):
+        while not self._stopped.wait(self.poll_interval):
+            for path in self._check():
+                logger.info(f"File is stable: {path}")
+                # A failing callback must not stop the tracker thread
+                try:
+                    self.on_stable(path)
+                except Exception:
+                    logger.exception(f"Error handling stable file {path}")
+
+    def _check(self):
+        now = time.monotonic()
+        stable = []
+        with self._lock:
+            for path, state in list(self._files.items()):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    logger.warning(f"File no longer exists: {path}")
+                    del self._files[path]
+                    continue
+                except OSError as e:
+                    logger.warning(f"Error checking file stability: {e}")
+                    continue
+                
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if signature != state[0]:
+                    # Still being written: restart the quiet window
+                    if state[0] is not None:
+                        state[1] = now
+                    state[0] = signature
+                    continue
+                if state[2] or now - state[1] >= self.settle_seconds:
+                    del self._files[path]
+                    METRICS.observe("settle_wait", now - state[3])
+                    stable.append(path)
+        return stable
+
+class NodeClaims:
+    """Lease-based claims that let several nodes share one drop folder.
+
+    A node claims a dropped PDF by renaming it into ``processing/<node-id>/``; the
+    rename is atomic, so exactly one node wins and the others skip the file. Each
+    node renews its lease file ``processing/<node-id>.lease`` every third of
+    lease_timeout. PDFs held by a node whose lease is older than lease_timeout (or
+    gone) are claimed again by a live node. Claimed PDFs are passed to on_claimed.
+    """
+
+    def __init__(self, drop_folder, node_id, on_claimed, lease_timeout=DEFAULT_LEASE_TIMEOUT):
+        if not node_id or os.sep in node_id or node_id.startswith("."):
+            raise ValueError(f"Invalid node ID: {node_id!r}")
+        self.node_id = node_id
+        self.on_claimed = on_claimed
+        self.lease_timeout = lease_timeout
+        self.processing_folder = os.path.join(drop_folder, PROCESSING_FOLDER)
+        self.claim_folder = os.path.join(self.processing_folder, node_id)
+        self.lease_path = os.path.join(self.processing_folder, node_id + LEASE_SUFFIX)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Take the lease, resume this node's earlier claims and start the heartbeat thread."""
+        os.makedirs(self.claim_folder, exist_ok=True)
+        self._renew()
+        for entry in sorted(os.scandir(self.claim_folder), key=lambda entry: entry.name):
+            if entry.is_file() and entry.name.lower().endswith('.pdf'):
+                logger.info(f"Resuming claimed PDF: {entry.path}")
+                self.on_claimed(entry.path)
+        self._thread = threading.Thread(target=self._run, name="pdf-lease", daemon=True)
+        self._thread.start()
+        logger.info(f"Claiming PDFs as node {self.node_id} (lease timeout {self.lease_timeout:g}s)")
+
+    def stop(self):
+        """Stop renewing and give up the lease, so PDFs still claimed here are taken over."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            os.unlink(self.lease_path)
+        except FileNotFoundError:
+            pass
+
+    def claim(self, pdf_path):
+        """Claim a PDF for this node. Returns its path in the claim folder, or None if another node won."""
+        # Only this node renames files into its claim folder, so a free name stays free
+        stem, ext = os.path.splitext(os.path.basename(pdf_path))
+        claimed_path = os.path.join(self.claim_folder, stem + ext)
+        copy_num = 1
+        while os.path.exists(claimed_path):
+            copy_num += 1
+            claimed_path = os.path.join(self.claim_folder, f"{stem}_{copy_num}{ext}")
+        try:
+            os.rename(pdf_path, claimed_path)
+        except FileNotFoundError:
+            logger.info(f"Already claimed by another node: {pdf_path}")
+            return None
+        except OSError as e:
+            logger.error(f"Could not claim {pdf_path}: {e}")
+            return None
+        METRICS.increment("claims")
+        return claimed_path
+
+    def submit(self, pdf_path):
+        """Claim a PDF and hand it to on_claimed if this node won it."""
+        claimed_path = self.claim(pdf_path)
+        if claimed_path is not None:
+            self.on_claimed(claimed_path)
+
+    def _renew(self):
+        try:
+            os.utime(self.lease_path)
+        except FileNotFoundError:
+            write_json_atomic(self.lease_path, {"node_id": self.node_id, "host": socket.gethostname(),
+                                                "pid": os.getpid()})
+
+    def _run(self):
+        while not self._stopped.wait(self.lease_timeout / 3):
+            try:
+                self._renew()
+                self._reclaim_expired()
+            except OSError as e:
+                logger.warning(f"Lease heartbeat failed: {e}")
+
+    def _reclaim_expired(self):
+        """Claim the PDFs of nodes whose lease has expired."""
+        for entry in os.scandir(self.processing_folder):
+            if not entry.is_dir() or entry.name == self.node_id:
+                continue
+            lease_path = os.path.join(self.processing_folder, entry.name + LEASE_SUFFIX)
+            try:
+                lease_age = time.time() - os.stat(lease_path).st_mtime
+            except FileNotFoundError:
+                lease_age = None
+            if lease_age is not None and lease_age < self.lease_timeout:
+                continue
+            for pdf in os.scandir(entry.path):
+                if pdf.is_file() and pdf.name.lower().endswith('.pdf'):
+                    logger.warning(f"Reclaiming {pdf.path} from node {entry.name}, whose lease has expired")
+                    claimed_path = self.claim(pdf.path)
+                    if claimed_path is not None:
+                        METRICS.increment("claims_reclaimed")
+                        self.on_claimed(claimed_path)
+
+class PDFHandler(FileSystemEventHandler):
+    def __init__(self, tracker):
+        self.tracker = tracker
+    
+    @staticmethod
+    def _is_pdf(event, path):
+        return not event.is_directory and path.lower().endswith('.pdf')
+        
+    def on_created(self, event):
+        if self._is_pdf(event, event.src_path):
+            METRICS.increment("events_created")
+            logger.info(f"New PDF detected: {event.src_path}")
+            
+            # Only track here; the tracker queues the file for the worker pool once it is stable
+            self.tracker.touch(event.src_path)
+
+    def on_modified(self, event):
+        if self._is_pdf(event, event.src_path):
+            METRICS.increment("events_modified")
+            self.tracker.touch(event.src_path)
+
+    def on_closed(self, event):
+        if self._is_pdf(event, event.src_path):
+            METRICS.increment("events_closed")
+            self.tracker.mark_closed(event.src_path)
+
+    def on_deleted(self, event):
+        if self._is_pdf(event, event.src_path):
+            METRICS.increment("events_deleted")
+            self.tracker.forget(event.src_path)
+
+    def on_moved(self, event):
+        # Uploaders often write to a temporary name and rename it into place when done
+        self.tracker.forget(event.src_path)
+        renamed_in_place = os.path.dirname(event.dest_path) == os.path.dirname(event.src_path)
+        if renamed_in_place and self._is_pdf(event, event.dest_path):
+            METRICS.increment("events_moved")
+            logger.info(f"New PDF detected: {event.dest_path}")
+            self.tracker.touch(event.dest_path)
+            self.tracker.mark_closed(event.dest_path)
+
+def _upload_file_name(name):
+    """Return a safe PDF file name for an upload, from the name the client gave (if any)."""
+    name = os.path.basename((name or "").replace("\\", "/"))
+    name = ''.join(c if c.isalnum() or c in [' ', '_', '-', '.'] else '_' for c in name).strip(" .")
+    if not name:
+        name = "upload"
+    if not name.lower().endswith('.pdf'):
+        name += ".pdf"
+    return name
+
+class IngestServer:
+    """An asyncio HTTP server that streams uploaded PDFs into the work queue.
+
+    ``POST /jobs?name=report.pdf`` streams the request body into the spool folder
+    and queues it, answering 202 with a job ID; ``GET /jobs/<id>`` reports the job's
+    status and, once it is done, its output folder and splits as the job reported
+    them. Bodies over max_upload_bytes are refused before they are read. At most
+    max_uploads bodies are read at once, and an upload holds its slot until the
+    work queue accepts it, so a full queue pushes back on clients through TCP.
+    Spooled PDFs left by a previous run are queued again on start.
+    """
+
+    def __init__(self, spool_folder, max_upload_bytes=DEFAULT_MAX_UPLOAD_MB * 1024 * 1024,
+                 max_uploads=DEFAULT_MAX_UPLOADS):
+        self.spool_folder = spool_folder
+        self.max_upload_bytes = max_upload_bytes
+        self.max_uploads = max(1, max_uploads)
+        self.work_queue = None
+        # job ID -> job status, oldest first; spooled PDF path -> job ID
+        self.jobs = OrderedDict()
+        self._job_ids = {}
+        self._loop = None
+        self._upload_slots = None
+
+    async def serve(self, work_queue, host=DEFAULT_SERVE_HOST, port=DEFAULT_SERVE_PORT):
+        """Accept uploads until cancelled, feeding them to work_queue."""
+        self.work_queue = work_queue
+        self._loop = asyncio.get_running_loop()
+        self._upload_slots = asyncio.Semaphore(self.max_uploads)
+        os.makedirs(self.spool_folder, exist_ok=True)
+        await self._recover()
+        server = await asyncio.start_server(self._handle, host, port, limit=SERVE_HEADER_BYTES)
+        logger.info(f"Accepting PDF uploads at http://{host}:{server.sockets[0].getsockname()[1]}/jobs")
+        async with server:
+            await server.serve_forever()
+
+    def job_started(self, pdf_path):
+        """Work queue callback, run on its dispatcher thread."""
+        self._loop.call_soon_threadsafe(self._update_job, pdf_path, {"status": "running"})
+
+    def job_finished(self, pdf_path, ok, outputs):
+        """Work queue callback, run on its dispatcher thread: record the job's outputs on the event loop."""
+        if pdf_path not in self._job_ids:
+            return
+        update = {"status": "done" if ok else "failed",
+                  "finished_at": datetime.now().isoformat(timespec="seconds")}
+        if outputs is not None:
+            update["output_folder"] = os.path.abspath(outputs["output_folder"])
+            update["splits"] = outputs["splits"]
+        if ok:
+            # The original has been moved to the original folder; drop its empty spool folder
+            try:
+                os.rmdir(os.path.dirname(pdf_path))
+            except OSError:
+                pass
+        self._loop.call_soon_threadsafe(self._update_job, pdf_path, update)
+
+    def _update_job(self, pdf_path, update):
+        job_id = self._job_ids.get(pdf_path)
+        if job_id is None:
+            return
+        self.jobs[job_id].update(update)
+        if update.get("status") in ("done", "failed"):
+            del self._job_ids[pdf_path]
+            # Forget the oldest finished jobs beyond the history limit
+            excess = len(self.jobs) - SERVE_JOB_HISTORY
+            for old_id in [job_id for job_id, job in self.jobs.items() if job["status"] in ("done", "failed")][:max(0, excess)]:
+                del self.jobs[old_id]
+
+    def _register_job(self, job_id, pdf_path, size, content_hash):
+        self.jobs[job_id] = {"id": job_id, "status": "queued", "source": os.path.basename(pdf_path), "size": size,
+                             "content_hash": content_hash,
+                             "submitted_at": datetime.now().isoformat(timespec="seconds")}
+        self._job_ids[pdf_path] = job_id
+
+    async def _recover(self):
+        """Queue again the uploads a previous run spooled but did not finish."""
+        for entry in os.scandir(self.spool_folder):
+            if not entry.is_dir():
+                continue
+            for spooled in os.scandir(entry.path):
+                if spooled.name.endswith(".part"):
+                    os.unlink(spooled.path)
+                elif spooled.name.lower().endswith('.pdf'):
+                    content_hash = await self._loop.run_in_executor(None, hash_file, spooled.path)
+                    self._register_job(entry.name, spooled.path, spooled.stat().st_size, content_hash)
+                    logger.info(f"Re-queueing upload {entry.name}: {spooled.path}")
+                    await self._loop.run_in_executor(None, self.work_queue.submit, spooled.path)
+
+    async def _handle(self, reader, writer):
+        """Serve one request per connection."""
+        try:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except asyncio.LimitOverrunError:
+                await self._respond(writer, 431, {"error": "Request headers too large"})
+                return
+            except asyncio.IncompleteReadError:
+                return
+            request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+            try:
+                method, target, _ = request_line.split(" ", 2)
+            except ValueError:
+                await self._respond(writer, 400, {"error": "Malformed request line"})
+                return
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            url = urlsplit(target)
+            path = url.path.rstrip("/")
+            if path == "/jobs" and method == "POST":
+                status, body = await self._create_job(reader, writer, headers, parse_qs(url.query))
+            elif path.startswith("/jobs/") and method == "GET":
+                job = self.jobs.get(path[len("/jobs/"):])
+                status, body = (200, job) if job is not None else (404, {"error": "Unknown job"})
+            elif path == "/jobs" or path.startswith("/jobs/"):
+                status, body = 405, {"error": f"{method} is not supported here"}
+            else:
+                status, body = 404, {"error": "Not found"}
+            if status is not None:
+                await self._respond(writer, status, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"Error serving request: {e}", exc_info=True)
+            try:
+                await self._respond(writer, 500, {"error": "Internal error"})
+            except Exception:
+                pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _create_job(self, reader, writer, headers, query):
+        """Stream an upload into the spool folder and queue it. Returns the response status and body."""
+        if headers.get("transfer-encoding"):
+            return 411, {"error": "Send the PDF with a Content-Length"}
+        try:
+            length = int(headers["content-length"])
+        except (KeyError, ValueError):
+            return 411, {"error": "Send the PDF with a Content-Length"}
+        if length <= 0:
+            return 400, {"error": "Empty upload"}
+        if length > self.max_upload_bytes:
+            return 413, {"error": f"Uploads are limited to {self.max_upload_bytes // (1024 * 1024)}MB"}
+        try:
+            priority = int(query.get("priority", ["0"])[0])
+        except ValueError:
+            return 400, {"error": "priority must be an integer"}
+        name = _upload_file_name(query.get("name", [headers.get("x-filename")])[0])
+        
+        async with self._upload_slots:
+            if headers.get("expect", "").lower() == "100-continue":
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                await writer.drain()
+            job_id = uuid.uuid4().hex
+            job_folder = os.path.join(self.spool_folder, job_id)
+            os.makedirs(job_folder)
+            pdf_path = os.path.join(job_folder, name)
+            part_path = f"{pdf_path}.part"
+            digest = hashlib.sha256()
+            received = 0
+            try:
+                with open(part_path, 'wb') as spool_file:
+                    while received < length:
+                        chunk = await reader.read(min(SERVE_READ_BYTES, length - received))
+                        if not chunk:
+                            raise ConnectionError("Client disconnected during upload")
+                        digest.update(chunk)
+                        await self._loop.run_in_executor(None, spool_file.write, chunk)
+                        received += len(chunk)
+                with open(part_path, 'rb') as spool_file:
+                    is_pdf = spool_file.read(5) == b"%PDF-"
+                if not is_pdf:
+                    shutil.rmtree(job_folder)
+                    return 415, {"error": "The upload is not a PDF"}
+                os.replace(part_path, pdf_path)
+            except BaseException:
+                shutil.rmtree(job_folder, ignore_errors=True)
+                raise
+            METRICS.increment("uploads_received")
+            METRICS.increment("upload_bytes_received", length)
+            self._register_job(job_id, pdf_path, length, digest.hexdigest())
+            # submit blocks while the work queue is full; this upload keeps its slot until then
+            await self._loop.run_in_executor(None, lambda: self.work_queue.submit(pdf_path, priority=priority))
+        logger.info(f"Accepted upload {job_id}: {name} ({length / (1024 * 1024):.2f}MB)")
+        return 202, dict(self.jobs[job_id], url=f"/jobs/{job_id}")
+
+    async def _respond(self, writer, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        reason = HTTPStatus(status).phrase
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload)
+        await writer.drain()
+
+def write_helper_file(name, content, force=False):
+    """Write a helper script next to this script, leaving an existing one alone unless force is set."""
+    path = get_absolute_path(name)
+    if os.path.exists(path) and not force:
+        logger.info(f"Skipped {name}: {path} already exists (use --force to replace it)")
+        return False
+    with open(path, 'w') as f:
+        f.write(content)
+    logger.info(f"Created {name} at {path}")
+    return True
+
+def create_autorun_setup(force=False):
+    """Create the batch files for autorun setup.
+
+    setup.py and README.md are maintained in the repository and are never generated.
+    """
+    # Create autorun.bat for Windows
+    batch_content = """@echo off
+echo Setting up PDF Splitter to run automatically...
+
+:: Create a shortcut in the startup folder
+powershell "$WshShell = New-Object -ComObject WScript.Shell; $Shortcut = $WshShell.CreateShortcut('%APPDATA%\\Microsoft\\Windows\\Start Menu\\Programs\\Startup\\PDF Splitter.lnk'); $Shortcut.TargetPath = '%~dp0start_pdf_splitter.bat'; $Shortcut.WorkingDirectory = '%~dp0'; $Shortcut.Description = 'Start PDF Splitter'; $Shortcut.Save()"
+
+echo Created startup shortcut. PDF Splitter will now run automatically when you log in.
+
+:: Start the script now
+start "" "%~dp0start_pdf_splitter.bat"
+
+echo PDF Splitter is now running.
+pause
+"""
+    write_helper_file("setup_autorun.bat", batch_content, force)
+    
+    # Create start script
+    start_content = """@echo off
+echo Starting PDF Splitter...
+"%~dp0venv\\Scripts\\pythonw.exe" "%~dp0pdf_splitter.py"
+echo PDF Splitter is running in the background.
+"""
+    write_helper_file("start_pdf_splitter.bat", start_content, force)
+
+def iter_batch_pdfs(paths, recursive=False, on_error=None):
+    """Yield (path, size_bytes) for the PDFs named by paths: files, or folders scanned with os.scandir.
+
+    Subfolders are only scanned with recursive. on_error, if given, is called with
+    the path and the OSError of anything that cannot be read; it is skipped.
+    """
+    for path in paths:
+        try:
+            if not os.path.isdir(path):
+                if path.lower().endswith('.pdf'):
+                    yield path, os.path.getsize(path)
+                continue
+            folders = [path]
+            while folders:
+                with os.scandir(folders.pop()) as entries:
+                    # Sorted, so runs over the same tree queue files in the same order
+                    for entry in sorted(entries, key=lambda entry: entry.name):
+                        if entry.is_dir():
+                            if recursive:
+                                folders.append(entry.path)
+                        elif entry.is_file() and entry.name.lower().endswith('.pdf'):
+                            yield entry.path, entry.stat().st_size
+        except OSError as e:
+            logger.error(f"Could not read {path}: {e}")
+            if on_error is not None:
+                on_error(path, e)
+
+def read_file_list(list_path):
+    """Return the paths listed one per line in a file ("-" for standard input), skipping blank lines."""
+    if list_path == "-":
+        return [line.strip() for line in sys.stdin if line.strip()]
+    with open(list_path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+def build_split_options(args):
+    """Return the keyword arguments the work queue passes to the split job for these arguments."""
+    if args.output_mode == "jsonl":
+        return dict(max_chars=args.chunk_chars, max_tokens=args.chunk_tokens)
+    return dict(max_size_mb=args.max_size, split_workers=args.split_workers,
+                use_index=not args.no_index, on_duplicate=args.on_duplicate,
+                optimize=args.optimize, text_workers=args.text_workers)
+
+def run_batch(args):
+    """Split every PDF named on the command line with the worker pool, leaving the originals in place.
+
+    Returns the number of failures: jobs that did not complete and paths that could not be read.
+    """
+    complete_folder = args.complete_folder
+    os.makedirs(complete_folder, exist_ok=True)
+    paths = list(args.paths)
+    if args.file_list:
+        paths.extend(read_file_list(args.file_list))
+    if not paths:
+        logger.error("No files or folders to process")
+        return 1
+    
+    uploader = None
+    if args.upload_url:
+        uploader = SplitUploader(args.upload_url, complete_folder, concurrency=args.upload_concurrency,
+                                 retries=args.upload_retries)
+        uploader.start()
+    work_queue = PDFWorkQueue(complete_folder, None, None,
+                              workers=args.workers, queue_size=args.queue_size,
+                              metrics_dir=args.metrics_dir, output_mode=args.output_mode,
+                              uploader=uploader, memory_budget_mb=args.memory_budget, max_rss_mb=args.max_rss,
+                              keyword_engine=args.keyword_engine, **build_split_options(args))
+    work_queue.start()
+    
+    unreadable = []
+    files = 0
+    started = time.perf_counter()
+    interrupted = False
+    try:
+        # submit blocks while the queue is full, so the tree is walked only as fast as it is processed
+        for pdf_path, _ in iter_batch_pdfs(paths, recursive=args.recursive,
+                                              on_error=lambda path, e: unreadable.append(path)):
+            if work_queue.submit(pdf_path):
+                files += 1
+        work_queue.stop()
+    except KeyboardInterrupt:
+        logger.info("Stopping batch due to keyboard interrupt")
+        interrupted = True
+        work_queue.stop(wait=False)
+    if uploader is not None:
+        uploader.stop()
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    
+    counters = METRICS.snapshot()["counters"]
+    failures = counters.get("jobs_failed", 0) + len(unreadable)
+    done = counters.get("jobs_succeeded", 0) + counters.get("jobs_failed", 0)
+    print(f"Processed {done} of {files} PDF(s) in {elapsed:.1f}s "
+          f"({counters.get('duplicates_found', 0)} already processed)")
+    # Duplicates answered from the index are not split, so only the PDFs actually split count as data
+    split_mb = counters.get("source_bytes_split", 0) / (1024 * 1024)
+    print(f"Throughput: {done / elapsed:.2f} files/s, {counters.get('pages_split', 0) / elapsed:.1f} pages/s, "
+          f"{split_mb / elapsed:.2f} MB/s")
+    if interrupted:
+        # Jobs cancelled by the interrupt did not complete either
+        failures += files - done
+    print(f"Failures: {failures}")
+    return failures
+
+def run_server(args):
+    """Accept PDF uploads over HTTP and split them with the worker pool until interrupted."""
+    drop_folder = args.drop_folder
+    complete_folder = args.complete_folder
+    original_folder = args.original_folder
+    os.makedirs(complete_folder, exist_ok=True)
+    os.makedirs(original_folder, exist_ok=True)
+    
+    server = IngestServer(os.path.join(drop_folder, UPLOADS_FOLDER),
+                          max_upload_bytes=args.max_upload_mb * 1024 * 1024, max_uploads=args.max_uploads)
+    uploader = None
+    if args.upload_url:
+        uploader = SplitUploader(args.upload_url, complete_folder, concurrency=args.upload_concurrency,
+                                 retries=args.upload_retries)
+        uploader.start()
+    work_queue = PDFWorkQueue(complete_folder, original_folder, None,
+                              workers=args.workers, queue_size=args.queue_size,
+                              metrics_dir=args.metrics_dir, output_mode=args.output_mode,
+                              uploader=uploader, memory_budget_mb=args.memory_budget, max_rss_mb=args.max_rss,
+                              on_started=server.job_started, on_finished=server.job_finished,
+                              keyword_engine=args.keyword_engine, **build_split_options(args))
+    work_queue.start()
+    metrics_server = start_metrics_server(args.metrics_port) if args.metrics_port is not None else None
+    
+    print(f"PDF Splitter accepting uploads at http://{args.host}:{args.port}/jobs")
+    print(f"Splits will be saved to: {complete_folder}")
+    try:
+        asyncio.run(server.serve(work_queue, args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info("Stopping PDF Splitter due to keyboard interrupt")
+    work_queue.stop()
+    if uploader is not None:
+        uploader.stop()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="PDF Splitter - Split PDFs into smaller files")
+    parser.add_argument("--drop-folder", help="Path to folder where PDFs will be dropped",
+                        default=DEFAULT_DROP_FOLDER)
+    parser.add_argument("--complete-folder", help="Path to folder where split PDFs will be stored",
+                        default=DEFAULT_COMPLETE_FOLDER)
+    parser.add_argument("--original-folder", help="Path to folder where original PDFs will be moved",
+                        default=DEFAULT_ORIGINAL_FOLDER)
+    parser.add_argument("--max-size", type=int, default=24,
+                        help="Maximum size in MB for split files (default: 24)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Number of worker processes splitting PDFs in parallel (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"Maximum number of PDFs waiting to be processed before new drops block (default: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("--memory-budget", type=int, default=None, metavar="MB",
+                        help="Only start a job while the estimated memory of all running jobs stays within "
+                             "this many MB; a larger job runs alone")
+    parser.add_argument("--split-workers", type=int, default=1,
+                        help="Number of processes writing the splits of a single PDF in parallel (default: 1)")
+    parser.add_argument("--text-workers", type=int, default=DEFAULT_TEXT_WORKERS,
+                        help=f"Number of processes extracting the text used to name the splits of a long "
+                             f"PDF (default: {DEFAULT_TEXT_WORKERS}, in-process)")
+    parser.add_argument("--settle-time", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help=f"Seconds a dropped PDF must stop changing before it is processed (default: {DEFAULT_SETTLE_SECONDS})")
+    parser.add_argument("--on-duplicate", choices=DUPLICATE_ACTIONS, default="skip",
+                        help="What to do when already-processed content is dropped again: skip it, or hard-link "
+                             "or copy the existing splits into a new folder (default: skip)")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Do not keep or consult the index of processed PDFs")
+    parser.add_argument("--max-rss", type=int, default=None, metavar="MB",
+                        help="Enable low-memory mode and keep each job's memory use near this many MB")
+    parser.add_argument("--keyword-engine", choices=KEYWORD_ENGINES, default=DEFAULT_KEYWORD_ENGINE,
+                        help="How keywords for folder and split names are extracted: a fast single-pass "
+                             "tokenizer or NLTK's word_tokenize (default: fast)")
+    parser.add_argument("--node-id", default=None,
+                        help="Share the drop folder with other nodes: claim PDFs under this unique node ID")
+    parser.add_argument("--lease-timeout", type=float, default=DEFAULT_LEASE_TIMEOUT,
+                        help=f"Seconds after which the PDFs claimed by an unresponsive node are taken over "
+                             f"(default: {DEFAULT_LEASE_TIMEOUT:g})")
+    parser.add_argument("--upload-url", default=None,
+                        help="Upload every split to this http(s) URL as soon as it is written")
+    parser.add_argument("--upload-concurrency", type=int, default=DEFAULT_UPLOAD_CONCURRENCY,
+                        help=f"Maximum number of uploads running at once (default: {DEFAULT_UPLOAD_CONCURRENCY})")
+    parser.add_argument("--upload-retries", type=int, default=DEFAULT_UPLOAD_RETRIES,
+                        help=f"Times a failed upload request is retried (default: {DEFAULT_UPLOAD_RETRIES})")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Shrink splits by dropping unused resources, merging identical objects and "
+                             "compressing uncompressed streams, so more pages fit under --max-size")
+    parser.add_argument("--output-mode", choices=OUTPUT_MODES, default="pdf",
+                        help="Write PDF splits, or the text as training-ready JSONL chunks (default: pdf)")
+    parser.add_argument("--chunk-chars", type=int, default=DEFAULT_CHUNK_CHARS,
+                        help=f"Maximum characters per JSONL chunk (default: {DEFAULT_CHUNK_CHARS})")
+    parser.add_argument("--chunk-tokens", type=int, default=None,
+                        help="Maximum approximate tokens per JSONL chunk (default: no token limit)")
+    parser.add_argument("--metrics-dir",
+                        help="Write Prometheus metrics and per-job JSON summaries to this folder")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics over HTTP on this local port")
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    subparsers.add_parser("watch", help="Watch the drop folder and split new PDFs (the default)")
+    autorun_parser = subparsers.add_parser("autorun-setup", help="Create the Windows auto-start scripts, then exit")
+    autorun_parser.add_argument("--force", action="store_true", help="Replace scripts that already exist")
+    resplit_parser = subparsers.add_parser("resplit", help="Re-split processed documents for the current --max-size "
+                                                           "from their manifests, rewriting only changed ranges")
+    resplit_parser.add_argument("folders", nargs="+", metavar="FOLDER",
+                                help="Output folder of a processed document (a path, or a name in the complete folder)")
+    resplit_parser.add_argument("--source", default=None,
+                                help="Original PDF to read changed ranges from, if it is no longer where the "
+                                     "manifest says (only with a single FOLDER)")
+    batch_parser = subparsers.add_parser("batch", help="Split the PDFs in the given files and folders with the "
+                                                       "worker pool and exit, leaving the originals in place")
+    batch_parser.add_argument("paths", nargs="*", metavar="PATH", help="PDF file, or folder of PDFs, to process")
+    batch_parser.add_argument("--file-list", default=None, metavar="FILE",
+                              help="Also process the files and folders listed one per line in FILE (- for stdin)")
+    batch_parser.add_argument("--recursive", action="store_true", help="Also process PDFs in subfolders")
+    serve_parser = subparsers.add_parser("serve", help="Accept PDFs as HTTP uploads instead of watching the "
+                                                       "drop folder, with job status at /jobs/<id>")
+    serve_parser.add_argument("--host", default=DEFAULT_SERVE_HOST,
+                              help=f"Address to listen on (default: {DEFAULT_SERVE_HOST})")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_SERVE_PORT,
+                              help=f"Port to listen on (default: {DEFAULT_SERVE_PORT})")
+    serve_parser.add_argument("--max-upload-mb", type=int, default=DEFAULT_MAX_UPLOAD_MB,
+                              help=f"Largest upload accepted, in MB (default: {DEFAULT_MAX_UPLOAD_MB})")
+    serve_parser.add_argument("--max-uploads", type=int, default=DEFAULT_MAX_UPLOADS,
+                              help=f"Uploads received at the same time; further ones wait "
+                                   f"(default: {DEFAULT_MAX_UPLOADS})")
+    return parser.parse_args()
+
+def main():
+    # Parse command line arguments
+    args = parse_arguments()
+    
+    # Set up logging level
+    if args.debug:
+        logging.getLogger().setLevel(logging.DEBUG)
+        logger.debug("Debug logging enabled")
+    
+    if args.command == "autorun-setup":
+        # Create helper scripts for auto-start
+        create_autorun_setup(force=args.force)
+        return
+    
+    if args.command == "resplit":
+        if args.source and len(args.folders) > 1:
+            sys.exit("--source can only be used with a single folder")
+        failed = 0
+        for folder in args.folders:
+            output_folder = folder if os.path.isdir(folder) else os.path.join(args.complete_folder, folder)
+            if not resplit_document(output_folder, args.max_size, None, source_path=args.source,
+                                    use_index=not args.no_index):
+                failed += 1
+        if failed:
+            sys.exit(f"{failed} of {len(args.folders)} folder(s) could not be resplit")
+        return
+    
+    if args.command == "batch":
+        failures = run_batch(args)
+        if failures:
+            sys.exit(1)
+        return
+    
+    if args.command == "serve":
+        run_server(args)
+        return
+    
+    # Set up the folders
+    drop_folder = args.drop_folder
+    complete_folder = args.complete_folder
+    original_folder = args.original_folder
+    max_size = args.max_size
+    
+    logger.info(f"Starting PDF Splitter with max size: {max_size}MB")
+    logger.info(f"Drop folder: {drop_folder}")
+    logger.info(f"Complete folder: {complete_folder}")
+    logger.info(f"Original folder: {original_folder}")
+    
+    # Create the folders if they don't exist
+    os.makedirs(drop_folder, exist_ok=True)
+    os.makedirs(complete_folder, exist_ok=True)
+    os.makedirs(original_folder, exist_ok=True)
+    
+    # Stopwords are loaded by each worker when it first extracts keywords, keeping NLTK off the startup path
+    stop_words = None
+    
+    print(f"PDF Splitter started. Watching for PDFs in: {drop_folder}")
+    print(f"Splits will be saved to: {complete_folder}")
+    print(f"Original PDFs will be moved to: {original_folder}")
+    if args.output_mode == "jsonl":
+        print(f"Writing text chunks of up to {args.chunk_chars} characters"
+              + (f" / {args.chunk_tokens} tokens" if args.chunk_tokens else "") + " as JSONL")
+    else:
+        print(f"Maximum split size: {max_size}MB")
+    print(f"Worker processes: {args.workers}")
+    
+    # Set up the worker pool that consumes the work queue
+    split_options = build_split_options(args)
+    uploader = None
+    if args.upload_url:
+        uploader = SplitUploader(args.upload_url, complete_folder, concurrency=args.upload_concurrency,
+                                 retries=args.upload_retries)
+        uploader.start()
+        print(f"Uploading splits to: {args.upload_url}")
+    work_queue = PDFWorkQueue(complete_folder, original_folder, stop_words,
+                              workers=args.workers, queue_size=args.queue_size,
+                              metrics_dir=args.metrics_dir, output_mode=args.output_mode,
+                              uploader=uploader, memory_budget_mb=args.memory_budget, max_rss_mb=args.max_rss,
+                              keyword_engine=args.keyword_engine, **split_options)
+    work_queue.start()
+    
+    metrics_server = start_metrics_server(args.metrics_port) if args.metrics_port is not None else None
+    
+    # With a node ID, claim each PDF before queueing it so nodes sharing the drop folder never split the same file
+    claims = None
+    submit = work_queue.submit
+    if args.node_id:
+        claims = NodeClaims(drop_folder, args.node_id, work_queue.submit, lease_timeout=args.lease_timeout)
+        claims.start()
+        submit = claims.submit
+    
+    # Release dropped files to the work queue once they have stopped changing
+    tracker = FileStabilityTracker(submit, settle_seconds=args.settle_time)
+    tracker.start()
+    
+    # Set up the file system observer
+    event_handler = PDFHandler(tracker)
+    observer = Observer()
+    observer.schedule(event_handler, drop_folder, recursive=False)
+    observer.start()
+    
+    # Startup ends once new drops are being watched; the backlog scan below is ordinary work
+    startup_seconds = time.perf_counter() - STARTUP_STARTED
+    METRICS.observe("startup", startup_seconds)
+    logger.info(f"Started in {startup_seconds:.3f}s")
+    if args.metrics_dir:
+        write_metrics_file(args.metrics_dir)
+    
+    try:
+        # Process any existing PDF files in the drop folder, answering already-processed ones from the index
+        # The index only records PDF splits
+        index = None if args.no_index or args.output_mode != "pdf" else ProcessingIndex(complete_folder)
+        # Queue the backlog smallest first, so the jobs that start before the rest are queued are cheap ones
+        backlog = [entry for entry in os.scandir(drop_folder) if entry.is_file() and entry.name.lower().endswith('.pdf')]
+        for entry in sorted(backlog, key=lambda entry: entry.stat().st_size):
+            pdf_path = entry.path
+            logger.info(f"Found existing PDF in drop folder: {pdf_path}")
+            if claims is not None:
+                pdf_path = claims.claim(pdf_path)
+                if pdf_path is None:
+                    continue
+            try:
+                record = find_processed_duplicate(pdf_path, index, max_size, args.optimize) if index is not None else None
+                if record is not None:
+                    handle_duplicate(pdf_path, record, complete_folder, original_folder, args.on_duplicate)
+                    continue
+            except Exception as e:
+                logger.warning(f"Could not check {pdf_path} against the index: {e}")
+            work_queue.submit(pdf_path)
         
         # Run indefinitely
         logger.info("Watching for new PDFs...")
@@ -575,6 +3582,14 @@ def main():
         logger.error(f"Unexpected error: {e}", exc_info=True)
         observer.stop()
     observer.join()
+    tracker.stop()
+    work_queue.stop()
+    if claims is not None:
+        claims.stop()
+    if uploader is not None:
+        uploader.stop()
+    if metrics_server is not None:
+        metrics_server.shutdown()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,330 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+import pdf_splitter
+from pdf_splitter import _cut_text, chunk_page_texts, count_tokens
+
+
+def _random_text(rng, words):
+    """Text mixing ordinary words, punctuation and long runs without whitespace."""
+    pieces = []
+    for _ in range(words):
+        kind = rng.random()
+        if kind < 0.7:
+            pieces.append("".join(rng.choice("abcdefgh") for _ in range(rng.randint(1, 9))))
+        elif kind < 0.9:
+            pieces.append(",".join("abcdefgh"[:rng.randint(1, 8)]))
+        else:
+            pieces.append("x" * rng.randint(10, 40))
+    return rng.choice([" ", "  ", "\n"]).join(pieces)
+
+
+@pytest.mark.parametrize("max_chars, max_tokens", [(None, 2), (None, 5), (8, None), (12, 3), (30, 7)])
+def test_cut_text_stays_within_budget(max_chars, max_tokens):
+    rng = random.Random(f"{max_chars}-{max_tokens}")
+    for _ in range(50):
+        text = _random_text(rng, rng.randint(1, 40))
+        pieces = list(_cut_text(text, max_chars, max_tokens))
+        for piece in pieces:
+            assert piece
+            assert max_chars is None or len(piece) <= max_chars
+            assert max_tokens is None or count_tokens(piece) <= max_tokens
+        # Cutting only moves whitespace around
+        assert "".join("".join(pieces).split()) == "".join(text.split())
+        if max_chars is None:
+            # Without a character budget no token is cut in two
+            assert sum(count_tokens(piece) for piece in pieces) == count_tokens(text)
+
+
+def test_cut_text_splits_runs_without_whitespace_on_token_boundaries():
+    assert list(_cut_text("a,b,c,d,e", max_tokens=2)) == ["a,", "b,", "c,", "d,", "e"]
+
+
+def test_cut_text_cuts_a_word_longer_than_max_chars():
+    assert list(_cut_text("abcdefghij", max_chars=4)) == ["abcd", "efgh", "ij"]
+
+
+@pytest.mark.parametrize("max_chars, max_tokens", [(None, 4), (20, None), (25, 6)])
+def test_chunk_page_texts_stays_within_budget(max_chars, max_tokens):
+    rng = random.Random(f"pages-{max_chars}-{max_tokens}")
+    page_texts = [(page_num, _random_text(rng, rng.randint(0, 15)) if page_num % 4 else "")
+                  for page_num in range(30)]
+    chunks = list(chunk_page_texts(page_texts, max_chars, max_tokens))
+    previous_start = 0
+    for start_page, end_page, text in chunks:
+        assert text.strip()
+        assert start_page < end_page
+        assert start_page >= previous_start
+        previous_start = start_page
+        assert max_chars is None or len(text) <= max_chars
+        assert max_tokens is None or count_tokens(text) <= max_tokens
+    if max_chars is None:
+        assert sum(count_tokens(text) for _, _, text in chunks) == sum(count_tokens(text) for _, text in page_texts)
+
+
+def test_chunk_page_texts_skips_blank_pages():
+    page_texts = [(0, "first page"), (1, ""), (2, "  \n "), (3, "last page")]
+    assert list(chunk_page_texts(page_texts, max_chars=100)) == [(0, 4, "first page\nlast page")]
+    assert list(chunk_page_texts([(0, ""), (1, " ")], max_chars=100)) == []
+
+
+# One sentence per entry, so NLTK's sentence splitter has nothing to decide
+KEYWORD_CORPUS = [
+    "Check the pressure*valve before starting the turbine.",
+    "The pressure`valve and ``quoted`` words are split at backticks.",
+    "Use a---dashes style break, or double--dashes, or en–dashes and em—dashes.",
+    "Solve f(x)=turbine output for the rotor assembly.",
+    "We're gonna need the wrench and we gotta check the seals, wanna see?",
+    "Gimme the manual, lemme read it, I cannot find the torque table.",
+    "There's more'n enough torque in the gearbox.",
+    "'Twas the night before the inspection.",
+    "The turbine's housing wasn't sealed; operators'll check the valves' seals.",
+    "\"Rotor\" and 'blade' and “stator” and «housing» were listed.",
+    "Values 3,500 and 1.25 and 4,turbine were logged: pressure:high, flow:normal.",
+    "Wait... pressure drops.. then rises again",
+    "(turbine) [valve] {rotor} <stator> were checked twice!",
+    "Contact service@example.com about #maintenance for $1200 or 100% R&D budget.",
+    "Section 4.2.1 covers maintenance_log entries and c++ code samples.",
+    "Café staff read the naïve résumé about the façade.",
+    "The inspector's report said: \"Replace the bearing's seal.\"",
+]
+
+
+@pytest.fixture
+def nltk_engine(monkeypatch):
+    """Make the nltk keyword engine usable, with or without NLTK's sentence splitter data."""
+    tokenize = pytest.importorskip("nltk.tokenize")
+    try:
+        tokenize.word_tokenize("Punkt data check.")
+    except LookupError:
+        # word_tokenize splits sentences with punkt, then tokenizes each one with NLTKWordTokenizer
+        monkeypatch.setattr(pdf_splitter, "word_tokenize", tokenize.NLTKWordTokenizer().tokenize)
+
+
+@pytest.mark.parametrize("stop_words", [frozenset(), pdf_splitter.FALLBACK_STOP_WORDS])
+def test_fast_keyword_engine_matches_nltk(nltk_engine, stop_words):
+    for sentence in KEYWORD_CORPUS:
+        assert (pdf_splitter._keyword_counts(sentence, stop_words, "fast")
+                == pdf_splitter._keyword_counts(sentence, stop_words, "nltk")), sentence
+    nltk_counts = sum((pdf_splitter._keyword_counts(sentence, stop_words, "nltk") for sentence in KEYWORD_CORPUS),
+                      Counter())
+    assert pdf_splitter._keyword_counts(" ".join(KEYWORD_CORPUS), stop_words, "fast") == nltk_counts
+
+
+@pytest.mark.parametrize("text, keywords", [
+    ("pressure*valve", ["pressure", "valve"]),
+    ("pressure`valve", ["pressure", "valve"]),
+    ("a---dashes", []),
+    ("f(x)=turbine", []),
+    ("gonna gotta wanna cannot", []),
+])
+def test_fast_keyword_engine_token_rules(text, keywords):
+    assert list(pdf_splitter._keyword_counts(text, frozenset(), "fast")) == keywords
+
+
+def test_duplicate_folder_keeps_the_base_name(tmp_path):
+    existing = tmp_path / "pump_valve_report_20260101_120000_2"
+    existing.mkdir()
+    (existing / "01_pump_valve_p1-p2.pdf").write_bytes(b"%PDF-1.4 split")
+    record = {"output_folder": existing.name, "splits": [{"file": "01_pump_valve_p1-p2.pdf", "size": 14}]}
+    outputs = pdf_splitter.handle_duplicate(str(tmp_path / "report.pdf"), record, str(tmp_path), None, "link")
+    new_name = os.path.basename(outputs["output_folder"])
+    assert new_name != existing.name
+    assert pdf_splitter.FOLDER_NAME_SUFFIX_PATTERN.sub("", new_name) == "pump_valve_report"
+    assert os.listdir(outputs["output_folder"]) == ["01_pump_valve_p1-p2.pdf"]
+
+
+def test_reserve_skips_taken_folder_names(tmp_path):
+    (tmp_path / "report").mkdir()
+    first = pdf_splitter.OutputCommitter.reserve(str(tmp_path), "report")
+    second = pdf_splitter.OutputCommitter.reserve(str(tmp_path), "report")
+    assert (first.folder_name, second.folder_name) == ("report_2", "report_3")
+
+
+def test_publish_takes_the_next_free_name_when_its_own_was_taken(tmp_path):
+    committer = pdf_splitter.OutputCommitter.reserve(str(tmp_path), "report", owner="abc")
+    (tmp_path / ".staging" / "report" / "01_report_p1-p2.pdf").write_bytes(b"%PDF-1.4 split")
+    # A folder made by hand and another job's reservation take the next names meanwhile
+    (tmp_path / "report").mkdir()
+    (tmp_path / "report" / "notes.txt").write_text("mine")
+    other = pdf_splitter.OutputCommitter.reserve(str(tmp_path), "report")
+    assert other.folder_name == "report_2"
+    published = committer.publish()
+    assert published == str(tmp_path / "report_3") == committer.final_folder
+    assert committer.folder_name == "report_3"
+    assert os.listdir(published) == ["01_report_p1-p2.pdf"]
+    assert os.listdir(tmp_path / "report") == ["notes.txt"]
+    assert other.publish() == str(tmp_path / "report_2")
+
+
+def test_originals_with_the_same_name_never_overwrite_each_other(tmp_path):
+    original_folder = tmp_path / "originals"
+    moved = []
+    for drop in ("a", "b", "c"):
+        (tmp_path / drop).mkdir()
+        (tmp_path / drop / "report.pdf").write_bytes(drop.encode())
+        moved.append(pdf_splitter.move_to_original_folder(str(tmp_path / drop / "report.pdf"), str(original_folder)))
+    assert moved[0] == str(original_folder / "report.pdf")
+    assert len(set(moved)) == 3
+    assert [open(path, "rb").read() for path in moved] == [b"a", b"b", b"c"]
+    assert not any((tmp_path / drop / "report.pdf").exists() for drop in ("a", "b", "c"))
+
+
+@pytest.fixture
+def processed_folder(tmp_path):
+    """A document split at 0.1MB, with its original moved to tmp_path/originals."""
+    import benchmark
+    pdf_path = tmp_path / "report.pdf"
+    benchmark.generate_pdf(str(pdf_path), 12, lines_per_page=5, image_kb=20)
+    outputs = pdf_splitter.split_pdf_by_size(str(pdf_path), str(tmp_path / "complete"), str(tmp_path / "originals"),
+                                             frozenset(), max_size_mb=0.1)
+    assert outputs
+    return outputs["output_folder"]
+
+
+def _folder_contents(folder):
+    return {entry.name: open(entry.path, "rb").read() for entry in os.scandir(folder)}
+
+
+def test_interrupted_resplit_leaves_the_old_folder_intact(processed_folder, monkeypatch):
+    before = _folder_contents(processed_folder)
+    
+    def crashing_generate_split_name(*args, **kwargs):
+        # New splits are named after the old splits that are not reused have been dropped
+        raise OSError("simulated crash")
+    
+    monkeypatch.setattr(pdf_splitter, "generate_split_name", crashing_generate_split_name)
+    assert not pdf_splitter.resplit_document(processed_folder, 0.2, frozenset())
+    assert _folder_contents(processed_folder) == before
+    assert os.listdir(os.path.join(os.path.dirname(processed_folder), ".staging")) == []
+
+
+def test_resplit_killed_while_swapping_is_recovered(processed_folder, monkeypatch):
+    before = _folder_contents(processed_folder)
+    original_rename = os.rename
+    
+    def killed_rename(source, target):
+        if source.endswith(pdf_splitter.REPLACEMENT_SUFFIX):
+            raise SystemExit("simulated kill")
+        return original_rename(source, target)
+    
+    # Killed after the old folder was moved aside, before the new one took its place
+    monkeypatch.setattr(os, "rename", killed_rename)
+    with pytest.raises(SystemExit):
+        pdf_splitter.resplit_document(processed_folder, 0.2, frozenset())
+    assert not os.path.exists(processed_folder)
+    monkeypatch.setattr(os, "rename", original_rename)
+    
+    pdf_splitter.OutputCommitter.recover_replaced(processed_folder)
+    assert _folder_contents(processed_folder) == before
+    assert pdf_splitter.resplit_document(processed_folder, 0.2, frozenset())
+    with open(os.path.join(processed_folder, pdf_splitter.MANIFEST_FILENAME)) as f:
+        manifest = json.load(f)
+    assert manifest["max_size_mb"] == 0.2
+    assert sorted(_folder_contents(processed_folder)) == sorted(
+        [split["file"] for split in manifest["splits"]] + [pdf_splitter.MANIFEST_FILENAME])
+    assert os.listdir(os.path.join(os.path.dirname(processed_folder), ".staging")) == []
+
+
+def _node(drop_folder, node_id, claimed, lease_timeout=60):
+    """A node with its claim folder and lease in place, but no heartbeat thread."""
+    node = pdf_splitter.NodeClaims(str(drop_folder), node_id, claimed.append, lease_timeout=lease_timeout)
+    os.makedirs(node.claim_folder, exist_ok=True)
+    node._renew()
+    return node
+
+
+def test_contending_nodes_claim_each_pdf_once(tmp_path):
+    pdfs = [tmp_path / f"doc{i}.pdf" for i in range(50)]
+    for pdf in pdfs:
+        pdf.write_bytes(b"%PDF-1.4")
+    nodes = [_node(tmp_path, node_id, []) for node_id in ("node-a", "node-b")]
+    barrier = threading.Barrier(len(nodes))
+    results = {node.node_id: [] for node in nodes}
+    
+    def claim_all(node):
+        barrier.wait()
+        for pdf in pdfs:
+            results[node.node_id].append(node.claim(str(pdf)))
+    
+    threads = [threading.Thread(target=claim_all, args=(node,)) for node in nodes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i in range(len(pdfs)):
+        winners = [results[node.node_id][i] for node in nodes if results[node.node_id][i] is not None]
+        assert len(winners) == 1
+        assert os.path.isfile(winners[0])
+    assert not any(pdf.exists() for pdf in pdfs)
+
+
+def test_pdfs_of_a_node_with_an_expired_lease_are_reclaimed(tmp_path):
+    (tmp_path / "report.pdf").write_bytes(b"%PDF-1.4")
+    (tmp_path / "memo.pdf").write_bytes(b"%PDF-1.4")
+    stale, gone, live = _node(tmp_path, "stale", []), _node(tmp_path, "gone", []), _node(tmp_path, "live", [])
+    assert stale.claim(str(tmp_path / "report.pdf"))
+    assert gone.claim(str(tmp_path / "memo.pdf"))
+    claimed = []
+    survivor = _node(tmp_path, "survivor", claimed, lease_timeout=60)
+    
+    # A fresh lease keeps its PDFs; one older than the timeout, or a missing one, gives them up
+    (tmp_path / "other.pdf").write_bytes(b"%PDF-1.4")
+    assert live.claim(str(tmp_path / "other.pdf"))
+    old = time.time() - 120
+    os.utime(stale.lease_path, (old, old))
+    os.unlink(gone.lease_path)
+    survivor._reclaim_expired()
+    assert sorted(os.path.basename(path) for path in claimed) == ["memo.pdf", "report.pdf"]
+    assert sorted(os.listdir(survivor.claim_folder)) == ["memo.pdf", "report.pdf"]
+    assert os.listdir(live.claim_folder) == ["other.pdf"]
+
+
+def test_interrupted_split_resumes_from_its_journal(tmp_path, monkeypatch):
+    import benchmark
+    source = tmp_path / "source.pdf"
+    benchmark.generate_pdf(str(source), 12, lines_per_page=5, image_kb=20)
+    expected = pdf_splitter.split_pdf_by_size(str(source), str(tmp_path / "reference"), None, frozenset(),
+                                              max_size_mb=0.1)
+    assert len(expected["splits"]) > 2
+    
+    pdf_path = tmp_path / "drop" / "report.pdf"
+    pdf_path.parent.mkdir()
+    pdf_path.write_bytes(source.read_bytes())
+    complete_folder = tmp_path / "complete"
+    original_write_split_range = pdf_splitter.write_split_range
+    written = []
+    crash_after = [2]
+    
+    def write_split_range(reader, start_page, end_page, *args, **kwargs):
+        if len(written) == crash_after[0]:
+            raise OSError("simulated crash")
+        written.append(start_page)
+        return original_write_split_range(reader, start_page, end_page, *args, **kwargs)
+    
+    monkeypatch.setattr(pdf_splitter, "write_split_range", write_split_range)
+    assert not pdf_splitter.split_pdf_by_size(str(pdf_path), str(complete_folder), str(tmp_path / "originals"),
+                                              frozenset(), max_size_mb=0.1)
+    journals = [name for name in os.listdir(complete_folder) if name.endswith(pdf_splitter.JOURNAL_SUFFIX)]
+    assert len(journals) == 1
+    
+    # The rerun writes only the ranges the first run did not finish
+    finished = list(written)
+    written.clear()
+    crash_after[0] = None
+    outputs = pdf_splitter.split_pdf_by_size(str(pdf_path), str(complete_folder), str(tmp_path / "originals"),
+                                             frozenset(), max_size_mb=0.1)
+    assert outputs
+    assert not set(written) & set(finished)
+    assert len(finished) + len(written) == len(expected["splits"])
+    assert outputs["splits"] == expected["splits"]
+    assert sorted(os.listdir(outputs["output_folder"])) == sorted(
+        [split["file"] for split in expected["splits"]] + [pdf_splitter.MANIFEST_FILENAME])
+    assert not any(name.endswith(pdf_splitter.JOURNAL_SUFFIX) for name in os.listdir(complete_folder))
+    assert os.listdir(complete_folder / ".staging") == []